@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from cart.models import Cart, CartItem
+from ecommerce.testing import ShopTestCase, make_customer, make_product, make_seller
+from orders import checkout
+
+
+class CustomerDashboardTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.product = make_product(seller)
+        self.customer = make_customer()
+        self.cart = Cart.objects.create(user=self.customer)
+        self.client.force_login(self.customer)
+
+    def place_order(self):
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            return checkout.place_order(self.customer, checkout.load_cart_lines(self.customer))
+
+    def test_dashboard_query_budget(self):
+        self.place_order()
+        # Session, user, order aggregate, recent orders, cart summary
+        with self.assertNumQueries(5):
+            self.client.get(reverse('customer-dashboard'))
+        # Session and user only: statistics and cart summary come from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('customer-dashboard'))
+        self.assertEqual(response.context['total_orders'], 1)
+        self.assertEqual(response.context['pending_orders'], 1)
+        self.assertEqual(response.context['total_spent'], 0)
+
+    def test_order_changes_refresh_the_statistics(self):
+        order = self.place_order()
+        self.client.get(reverse('customer-dashboard'))
+        with self.captureOnCommitCallbacks(execute=True):
+            order.cancel_order(cancelled_by=self.customer)
+        self.place_order()
+        response = self.client.get(reverse('customer-dashboard'))
+        self.assertEqual(response.context['total_orders'], 2)
+        self.assertEqual(response.context['pending_orders'], 1)
+        self.assertEqual(
+            [recent['status'] for recent in response.context['recent_orders']], ['pending', 'cancelled']
+        )
@@ -5,8 +5,9 @@ from accounts.models import CustomUser
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum, Count
 from store.models import Product, Review
-from orders.models import Order
-from cart.models import CartItem
+from orders.customer_stats import customer_stats
+from orders.rollups import seller_sales
+from cart.summary import cart_summary
 
 # Create your views here.
 def login_user(request):
@@ -64,30 +65,17 @@ def customer_dashboard(request):
     if request.user.role != 'customer':
         return redirect('store-home')
     
-    # Get customer statistics
-    total_orders = Order.objects.filter(user=request.user).count()
-    pending_orders = Order.objects.filter(user=request.user, status='pending').count()
-    completed_orders = Order.objects.filter(user=request.user, status='delivered').count()
-    
-    # Get recent orders
-    recent_orders = Order.objects.filter(user=request.user).order_by('-order_date')[:5]
-    
-    # Get cart items count
-    cart_items_count = CartItem.objects.filter(cart__user=request.user).count()
-    
-    # Get total spent (sum of completed orders)
-    total_spent = Order.objects.filter(
-        user=request.user, 
-        status__in=['delivered', 'shipped']
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    # One aggregate over the customer's orders, cached until they change
+    stats = customer_stats(request.user.id)
     
     context = {
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'completed_orders': completed_orders,
-        'recent_orders': recent_orders,
-        'cart_items_count': cart_items_count,
-        'total_spent': total_spent,
+        'total_orders': stats['total_orders'],
+        'pending_orders': stats['pending_orders'],
+        'completed_orders': stats['completed_orders'],
+        'recent_orders': stats['recent_orders'],
+        # Cached cart summary, no CartItem query
+        'cart_items_count': cart_summary(request.user.id)['lines'],
+        'total_spent': stats['total_spent'],
     }
     return render(request, 'dashboard/customer_dashboard.html', context)
 
@@ -126,13 +114,8 @@ def seller_dashboard(request):
         product__seller=request.user
     ).select_related('order', 'product').order_by('-order__order_date')[:5]
     
-    # Calculate total revenue (from delivered orders)
-    total_revenue = OrderItem.objects.filter(
-        product__seller=request.user,
-        order__status__in=['delivered', 'shipped']
-    ).aggregate(
-        revenue=Sum('price')
-    )['revenue'] or 0
+    # Revenue and the recent days' sales from the daily rollups (one small query)
+    sales = seller_sales(request.user)
     
     context = {
         'total_products': total_products,
@@ -143,6 +126,8 @@ def seller_dashboard(request):
         'avg_rating': avg_rating,
         'recent_reviews': recent_reviews,
         'seller_orders': seller_orders,
-        'total_revenue': total_revenue,
+        'total_revenue': sales['totals']['revenue'],
+        'sales_totals': sales['totals'],
+        'recent_sales': sales['recent'],
     }
     return render(request, 'dashboard/seller_dashboard.html', context)
\ No newline at end of file
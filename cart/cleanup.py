@@ -0,0 +1,62 @@
+"""
+Abandoned cart sweep.
+
+Carts are created on a shopper's first add and were never removed, and lines
+for products that went unavailable stayed behind. ``sweep`` deletes, in
+bounded batches, carts nobody has touched for ``STALE_DAYS`` (empty ones
+after ``EMPTY_DAYS``) and lines whose product is no longer available, so the
+cart tables and their indexes stay small. Each batch is its own short
+transaction and deletes only rows that still match, so a shopper who adds to
+a cart while the sweep runs keeps it. Lines for deleted products are already
+removed by the ``CartItem.product`` cascade.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import summary
+from .models import Cart, CartItem
+
+STALE_DAYS = 60
+EMPTY_DAYS = 1
+
+
+def unavailable_lines():
+    return CartItem.objects.filter(product__available=False)
+
+
+def stale_carts(days=STALE_DAYS, empty_days=EMPTY_DAYS):
+    now = timezone.now()
+    has_lines = Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+    return Cart.objects.filter(
+        Q(updated__lt=now - timedelta(days=days))
+        | (~has_lines & Q(updated__lt=now - timedelta(days=empty_days)))
+    )
+
+
+def _delete_in_batches(queryset, user_field, batch_size):
+    """Delete ``queryset`` a batch at a time; returns ``{model label: rows deleted}``"""
+    reclaimed = {}
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.order_by('id').values_list('id', user_field)[:batch_size])
+            if not batch:
+                return reclaimed
+            _, deleted = queryset.filter(id__in=[row_id for row_id, _ in batch]).delete()
+            summary.invalidate(*{user_id for _, user_id in batch})
+        for label, count in deleted.items():
+            reclaimed[label] = reclaimed.get(label, 0) + count
+
+
+def sweep(days=STALE_DAYS, empty_days=EMPTY_DAYS, batch_size=500):
+    """
+    Drop unavailable lines, then stale carts with their lines. Returns rows
+    deleted per model, e.g. ``{'cart.CartItem': 12, 'cart.Cart': 3}``.
+    """
+    reclaimed = _delete_in_batches(unavailable_lines(), 'cart__user_id', batch_size)
+    for label, count in _delete_in_batches(stale_carts(days, empty_days), 'user_id', batch_size).items():
+        reclaimed[label] = reclaimed.get(label, 0) + count
+    return reclaimed
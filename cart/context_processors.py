@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from cart.storage import get_cart
+
+
+def cart_summary(request):
+    """``cart_summary`` for the navbar, read only if a template uses it"""
+    return {'cart_summary': SimpleLazyObject(lambda: get_cart(request).summary())}
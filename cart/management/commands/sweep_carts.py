@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from cart.cleanup import EMPTY_DAYS, STALE_DAYS, sweep
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned carts and lines for unavailable products (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=STALE_DAYS,
+            help='Delete carts not touched for this many days',
+        )
+        parser.add_argument(
+            '--empty-days',
+            type=int,
+            default=EMPTY_DAYS,
+            help='Delete empty carts not touched for this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows deleted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        reclaimed = sweep(
+            days=options['days'],
+            empty_days=options['empty_days'],
+            batch_size=options['batch_size'],
+        )
+        carts = reclaimed.get('cart.Cart', 0)
+        lines = reclaimed.get('cart.CartItem', 0)
+        self.stdout.write(
+            self.style.SUCCESS(f'Reclaimed {carts + lines} rows: {carts} carts, {lines} cart lines')
+        )
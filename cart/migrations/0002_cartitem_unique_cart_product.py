@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:55
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """Fold repeated (cart, product) lines into one before adding the constraint"""
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), keep_id=Min('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for group in duplicates.iterator():
+        CartItem.objects.filter(id=group['keep_id']).update(quantity=group['total'])
+        CartItem.objects.filter(
+            cart_id=group['cart_id'], product_id=group['product_id']
+        ).exclude(id=group['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+        ('store', '0007_product_image_height_product_image_variants_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_from_created(apps, schema_editor):
+    """Existing carts count as last touched when they were created"""
+    Cart = apps.get_model('cart', 'Cart')
+    Cart.objects.update(updated=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(start_from_created, migrations.RunPython.noop),
+    ]
@@ -5,6 +5,8 @@ from store.models import Product
 class Cart(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={'role': 'customer'})
     created = models.DateTimeField(auto_now_add=True)
+    # Last time a line was added or changed; the abandoned-cart sweep keys on it
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Cart of {self.user.username}"
@@ -14,8 +16,17 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # One line per product; quantity changes are upserts on this key
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} ({self.quantity})"
     
     def get_total_price(self):
+        # Cart loaders annotate the line total, so no product price is needed
+        if hasattr(self, 'line_total'):
+            return self.line_total
         return self.product.price * self.quantity
@@ -0,0 +1,121 @@
+"""
+Cart mutations as set-based upserts.
+
+Lines are keyed by a unique (cart, product) constraint. Adding runs
+``INSERT ... ON CONFLICT DO NOTHING`` followed by
+``UPDATE ... SET quantity = MIN(quantity + n, MAX_QUANTITY)``, so concurrent
+clicks add up instead of overwriting each other. Setting quantities is one
+``INSERT ... ON CONFLICT DO UPDATE``. Either way a batch of any size costs
+the same handful of statements as a single line. Each mutation returns the
+lines it changed, so callers can respond without reading the cart back.
+"""
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from store.models import Product
+from . import summary
+from .models import Cart, CartItem
+
+MAX_QUANTITY = 999
+
+
+def parse_quantities(mapping, allow_zero=False):
+    """``{"12": 3}`` (e.g. from JSON) to ``{12: 3}``; raises ValueError if invalid"""
+    if not isinstance(mapping, dict):
+        raise ValueError("Quantities must be an object of product id -> quantity")
+    quantities = {}
+    for product_id, quantity in mapping.items():
+        product_id, quantity = int(product_id), int(quantity)
+        if quantity < (0 if allow_zero else 1) or quantity > MAX_QUANTITY:
+            raise ValueError(f"Invalid quantity for product {product_id}: {quantity}")
+        quantities[product_id] = quantity
+    return quantities
+
+
+def cart_id_for(user):
+    """Id of the user's cart, created on first use"""
+    cart_id = Cart.objects.filter(user=user).values_list('id', flat=True).first()
+    if cart_id is None:
+        cart_id = Cart.objects.get_or_create(user=user)[0].id
+    return cart_id
+
+
+def _available_names(product_ids):
+    return dict(
+        Product.objects.filter(id__in=list(product_ids), available=True).values_list('id', 'name')
+    )
+
+
+def _touch(cart_id):
+    # bulk_create and update() skip auto_now, so mark the cart as active here
+    Cart.objects.filter(id=cart_id).update(updated=timezone.now())
+
+
+def _result(lines, names, requested):
+    return {
+        'lines': lines,
+        'names': {product_id: names[product_id] for product_id in lines if product_id in names},
+        'rejected': sorted(set(requested) - set(names)),
+    }
+
+
+@transaction.atomic
+def add_items(cart_id, quantities):
+    """
+    Add ``{product_id: n}`` to a cart. Unknown or unavailable products are
+    skipped. Returns ``{'lines': {id: n added}, 'names': {...}, 'rejected': [...]}``.
+    """
+    names = _available_names(quantities) if quantities else {}
+    added = {product_id: quantity for product_id, quantity in quantities.items() if product_id in names}
+    if added:
+        CartItem.objects.bulk_create(
+            [CartItem(cart_id=cart_id, product_id=product_id, quantity=0) for product_id in added],
+            ignore_conflicts=True,
+        )
+        increment = Case(
+            *(When(product_id=product_id, then=Value(quantity)) for product_id, quantity in added.items()),
+            output_field=IntegerField(),
+        )
+        CartItem.objects.filter(cart_id=cart_id, product_id__in=list(added)).update(
+            # Capped like a session cart; a line never grows past what one request may set
+            quantity=Least(F('quantity') + increment, Value(MAX_QUANTITY))
+        )
+        _touch(cart_id)
+    return _result(added, names, quantities)
+
+
+@transaction.atomic
+def set_items(cart_id, quantities):
+    """
+    Set absolute quantities for ``{product_id: n}``; 0 removes the line.
+    Returns the same shape as ``add_items`` with the new quantities.
+    """
+    removed = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+    wanted = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+    if removed:
+        CartItem.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+    names = _available_names(wanted) if wanted else {}
+    lines = {product_id: quantity for product_id, quantity in wanted.items() if product_id in names}
+    if lines:
+        CartItem.objects.bulk_create(
+            [CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity) for product_id, quantity in lines.items()],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity'],
+        )
+    if lines or removed:
+        _touch(cart_id)
+    result = _result(lines, names, wanted)
+    result['lines'].update({product_id: 0 for product_id in removed})
+    return result
+
+
+def remove_item(user, item_id):
+    """Delete one of the user's lines by id; returns True if it existed"""
+    removed = CartItem.objects.filter(id=item_id, cart__user=user).delete()[0] > 0
+    if removed:
+        summary.invalidate(user.id)
+    return removed
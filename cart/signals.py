@@ -0,0 +1,10 @@
+from django.contrib.auth.signals import user_logged_in
+from django.dispatch import receiver
+
+
+@receiver(user_logged_in)
+def merge_session_cart_signal(sender, request, user, **kwargs):
+    """Carry what the shopper added while logged out into their saved cart"""
+    from cart.storage import merge_session_cart
+    if request is not None:
+        merge_session_cart(request, user)
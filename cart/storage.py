@@ -0,0 +1,200 @@
+"""
+Cart storage backends.
+
+Logged-in shoppers keep the persistent ``Cart``/``CartItem`` rows
+(``DatabaseCart``). Anonymous shoppers get a ``SessionCart`` held entirely in
+a signed, compressed cookie: browsing and abandoning a cart costs the
+database no writes at all, and there is no server-side entry to expire or
+evict. Each line stores the price seen when it was added, so the cart page
+total needs no price lookups. The anonymous cart is merged into the
+persistent one when the shopper logs in (and again at checkout in case the
+login merge was missed); checkout always re-prices from the database.
+
+Both backends expose ``add``, ``set``, ``lines``, ``total`` and ``summary``
+(line count, unit count and subtotal, without loading the lines); use
+``get_cart(request)`` to pick the right one. ``CartCookieMiddleware`` writes
+the cookie back when a ``SessionCart`` changed.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core import signing
+
+from orders.checkout import cart_total, load_cart_lines
+from store.models import Product
+from . import mutations, summary
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'cart.session'
+COOKIE_MAX_AGE = int(timedelta(days=30).total_seconds())
+# Keeps the cookie well under the 4KB browsers allow
+MAX_SESSION_LINES = 100
+
+
+class DatabaseCart:
+    """The logged-in user's persistent cart"""
+
+    def __init__(self, user):
+        self.user = user
+
+    def add(self, quantities):
+        result = mutations.add_items(mutations.cart_id_for(self.user), quantities)
+        summary.invalidate(self.user.id)
+        return result
+
+    def set(self, quantities):
+        result = mutations.set_items(mutations.cart_id_for(self.user), quantities)
+        summary.invalidate(self.user.id)
+        return result
+
+    def lines(self):
+        return load_cart_lines(self.user)
+
+    def total(self, lines):
+        return cart_total(lines)
+
+    def summary(self):
+        return summary.cart_summary(self.user.id)
+
+
+class SessionCartLine:
+    """A cookie cart line, shaped like CartItem for templates"""
+
+    def __init__(self, product, quantity, price):
+        self.product = product
+        self.product_id = product.id
+        self.quantity = quantity
+        self.price = price
+
+    def get_total_price(self):
+        return self.price * self.quantity
+
+
+class SessionCart:
+    """Anonymous cart in a signed cookie: ``[[product_id, quantity, price], ...]``"""
+
+    def __init__(self, request):
+        self.items = self._load(request.COOKIES.get(COOKIE_NAME))
+        self.modified = False
+
+    @staticmethod
+    def _load(value):
+        if not value:
+            return {}
+        try:
+            rows = signing.loads(value, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE)
+            return {int(product_id): (int(quantity), Decimal(price)) for product_id, quantity, price in rows}
+        except (signing.BadSignature, ValueError, TypeError, ArithmeticError):
+            return {}
+
+    def _prices(self, product_ids):
+        return {
+            product_id: (name, price)
+            for product_id, name, price in Product.objects.filter(
+                id__in=list(product_ids), available=True
+            ).values_list('id', 'name', 'price')
+        }
+
+    def _apply(self, quantities, absolute):
+        wanted = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+        products = self._prices(wanted) if wanted else {}
+        lines = {}
+        for product_id, quantity in quantities.items():
+            if quantity == 0 and absolute:
+                self.items.pop(product_id, None)
+                lines[product_id] = 0
+                continue
+            if product_id not in products:
+                continue
+            if product_id not in self.items and len(self.items) >= MAX_SESSION_LINES:
+                continue
+            current = 0 if absolute else self.items.get(product_id, (0, None))[0]
+            self.items[product_id] = (min(current + quantity, mutations.MAX_QUANTITY), products[product_id][1])
+            lines[product_id] = quantity
+        self.modified = True
+        return {
+            'lines': lines,
+            'names': {product_id: products[product_id][0] for product_id in lines if product_id in products},
+            'rejected': sorted(product_id for product_id in wanted if product_id not in lines),
+        }
+
+    def add(self, quantities):
+        return self._apply(quantities, absolute=False)
+
+    def set(self, quantities):
+        return self._apply(quantities, absolute=True)
+
+    def clear(self):
+        self.items = {}
+        self.modified = True
+
+    def lines(self):
+        products = Product.objects.in_bulk(list(self.items)) if self.items else {}
+        return [
+            SessionCartLine(products[product_id], quantity, price)
+            for product_id, (quantity, price) in self.items.items() if product_id in products
+        ]
+
+    def total(self, lines):
+        # Priced from the snapshot taken when each line was added
+        return sum((line.get_total_price() for line in lines), Decimal('0.00'))
+
+    def summary(self):
+        return {
+            'lines': len(self.items),
+            'units': sum(quantity for quantity, _ in self.items.values()),
+            'subtotal': sum((price * quantity for quantity, price in self.items.values()), Decimal('0.00')),
+        }
+
+    def write(self, response):
+        if not self.modified:
+            return
+        if not self.items:
+            response.delete_cookie(COOKIE_NAME)
+            return
+        rows = [[product_id, quantity, str(price)] for product_id, (quantity, price) in self.items.items()]
+        response.set_cookie(
+            COOKIE_NAME,
+            signing.dumps(rows, salt=COOKIE_SALT, compress=True),
+            max_age=COOKIE_MAX_AGE,
+            httponly=True,
+            samesite='Lax',
+        )
+
+
+def session_cart(request):
+    """The request's cookie cart, loaded once per request"""
+    if not hasattr(request, '_session_cart'):
+        request._session_cart = SessionCart(request)
+    return request._session_cart
+
+
+def get_cart(request):
+    if request.user.is_authenticated:
+        return DatabaseCart(request.user)
+    return session_cart(request)
+
+
+def merge_session_cart(request, user):
+    """Move the cookie cart's lines into ``user``'s persistent cart"""
+    cart = session_cart(request)
+    if not cart.items:
+        return None
+    result = DatabaseCart(user).add({product_id: quantity for product_id, (quantity, _) in cart.items.items()})
+    cart.clear()
+    return result
+
+
+class CartCookieMiddleware:
+    """Writes back (or deletes) the cookie cart if this request changed it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_session_cart', None)
+        if cart is not None:
+            cart.write(response)
+        return response
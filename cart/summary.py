@@ -0,0 +1,51 @@
+"""
+Cached cart summary: line count, unit count and subtotal.
+
+The navbar and the customer dashboard show these on every page, so they are
+read from the cache instead of ``CartItem``. A missing summary is rebuilt by
+one aggregate query; every cart mutation and checkout drops it once its
+transaction commits. The subtotal is a snapshot of the prices at that moment
+(a price change shows up within ``SUMMARY_TIMEOUT``); the cart page and
+checkout always price from the database.
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from .models import CartItem
+
+SUMMARY_TIMEOUT = 60 * 15
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def _key(user_id):
+    return f"cart-summary:{user_id}"
+
+
+def empty_summary():
+    return {'lines': 0, 'units': 0, 'subtotal': Decimal('0.00')}
+
+
+def cart_summary(user_id):
+    """``{'lines', 'units', 'subtotal'}`` for a user's cart, cached"""
+    summary = cache.get(_key(user_id))
+    if summary is None:
+        totals = CartItem.objects.filter(cart__user_id=user_id).aggregate(
+            lines=Count('id'), units=Sum('quantity'), subtotal=Sum(LINE_TOTAL)
+        )
+        summary = empty_summary()
+        summary.update({name: value for name, value in totals.items() if value})
+        cache.set(_key(user_id), summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate(*user_ids):
+    """Drop the users' cached summaries once the current transaction commits"""
+    keys = [_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
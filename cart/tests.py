@@ -1,3 +1,158 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart import summary
+from cart.models import Cart, CartItem
+from ecommerce.testing import ShopTestCase, make_customer, make_product, make_seller
+from orders.checkout import cart_total, load_cart_lines
+
+
+class CartMutationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.products = [
+            make_product(seller, f'Item {number}', price=2, stock=50)
+            for number in range(5)
+        ]
+        self.customer = make_customer()
+        self.client.force_login(self.customer)
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.customer).values_list('product_id', 'quantity'))
+
+    def test_repeated_adds_accumulate_on_one_line(self):
+        product = self.products[0]
+        for _ in range(3):
+            self.client.get(reverse('add-to-cart', args=[product.id]))
+        self.assertEqual(self.quantities(), {product.id: 3})
+
+    def test_adds_stop_at_the_maximum_quantity(self):
+        product = self.products[0]
+
+        def update(payload):
+            return self.client.post(reverse('update-cart'), json.dumps(payload), content_type='application/json')
+
+        update({'set': {str(product.id): 999}})
+        self.client.get(reverse('add-to-cart', args=[product.id]))
+        update({'add': {str(product.id): 5}})
+        self.assertEqual(self.quantities(), {product.id: 999})
+
+    def test_batch_update_adds_sets_and_removes(self):
+        first, second, third = self.products[:3]
+        self.client.get(reverse('add-to-cart', args=[third.id]))
+
+        def update(payload):
+            return self.client.post(reverse('update-cart'), json.dumps(payload), content_type='application/json')
+
+        response = update({'add': {str(first.id): 2, str(second.id): 1}, 'set': {str(third.id): 0}})
+        self.assertTrue(response.json()['success'])
+        response = update({'add': {str(first.id): 1}, 'set': {str(second.id): 7, '999999': 1}})
+        self.assertEqual(response.json()['rejected'], [999999])
+        self.assertEqual(self.quantities(), {first.id: 3, second.id: 7})
+
+    def test_batch_add_cost_does_not_grow_with_lines(self):
+        def queries_to_add(products):
+            payload = json.dumps({'add': {str(product.id): 1 for product in products}})
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(reverse('update-cart'), payload, content_type='application/json')
+            return len(queries)
+
+        queries_to_add(self.products[:1])  # creates the cart
+        self.assertEqual(queries_to_add(self.products[:1]), queries_to_add(self.products))
+
+    def test_lines_and_total_come_from_one_query(self):
+        payload = json.dumps({'set': {str(product.id): number + 1 for number, product in enumerate(self.products)}})
+        self.client.post(reverse('update-cart'), payload, content_type='application/json')
+        with self.assertNumQueries(1):
+            lines = load_cart_lines(self.customer)
+            line_totals = [line.get_total_price() for line in lines]
+            total = cart_total(lines)
+        self.assertEqual(line_totals, [2, 4, 6, 8, 10])
+        self.assertEqual(total, 30)
+
+    def test_summary_is_cached_until_the_cart_changes(self):
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('add-to-cart', args=[product.id]))
+        self.assertEqual(summary.cart_summary(self.customer.id), {'lines': 1, 'units': 1, 'subtotal': 2})
+        with self.assertNumQueries(0):
+            summary.cart_summary(self.customer.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('add-to-cart', args=[product.id]))
+        self.assertEqual(summary.cart_summary(self.customer.id)['units'], 2)
+        response = self.client.get(reverse('customer-dashboard'))
+        self.assertEqual(response.context['cart_items_count'], 1)
+        self.assertContains(response, 'title="$4.00"')
+
+
+class SessionCartTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.product = make_product(seller, 'Lamp', price=4, stock=10)
+        self.customer = make_customer()
+
+    def test_anonymous_cart_lives_in_cookie_and_merges_at_login(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('add-to-cart', args=[self.product.id]))
+            self.client.get(reverse('add-to-cart', args=[self.product.id]))
+        self.assertFalse(any(query['sql'].startswith(('INSERT', 'UPDATE')) for query in queries))
+        self.assertFalse(CartItem.objects.exists())
+        response = self.client.get(reverse('cart-view'))
+        self.assertEqual(response.context['total_price'], 8)
+
+        self.client.post(reverse('accounts-login'), {'username': 'customer', 'password': 'pw'})
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.customer).values_list('product_id', 'quantity')),
+            [(self.product.id, 2)],
+        )
+        self.assertEqual(self.client.cookies['cart'].value, '')
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies['cart'] = 'not-a-signed-value'
+        response = self.client.get(reverse('cart-view'))
+        self.assertEqual(list(response.context['cart_items']), [])
+
+
+class CartSweepTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.product = make_product(seller, 'Lamp', price=4, stock=10)
+        self.retired = make_product(seller, 'Old lamp', price=4, stock=10, available=False)
+
+    def cart(self, username, days_idle, products=()):
+        user = make_customer(username)
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for product in products])
+        Cart.objects.filter(id=cart.id).update(updated=timezone.now() - timedelta(days=days_idle))
+        return cart
+
+    def test_sweep_reclaims_stale_carts_and_unavailable_lines(self):
+        active = self.cart('active', 3, [self.product, self.retired])
+        self.cart('abandoned', 90, [self.product])
+        self.cart('empty', 2)
+        fresh_empty = self.cart('fresh-empty', 0)
+
+        out = StringIO()
+        call_command('sweep_carts', batch_size=1, stdout=out)
+
+        self.assertIn('Reclaimed 4 rows: 2 carts, 2 cart lines', out.getvalue())
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), {active.id, fresh_empty.id})
+        self.assertEqual(list(CartItem.objects.values_list('product_id', flat=True)), [self.product.id])
+
+    def test_cart_changes_keep_it_from_going_stale(self):
+        cart = self.cart('shopper', 90)
+        self.client.force_login(cart.user)
+        self.client.get(reverse('add-to-cart', args=[self.product.id]))
+        call_command('sweep_carts', stdout=StringIO())
+        self.assertTrue(Cart.objects.filter(id=cart.id).exists())
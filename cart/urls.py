@@ -1,8 +1,13 @@
 from django.urls import path
 from cart import views
+from orders import views as order_views
 
 urlpatterns = [
     path('', views.cart_view, name='cart-view'),
     path('add/<int:product_id>/', views.add_to_cart, name='add-to-cart'),
     path('remove/<int:item_id>/', views.remove_from_cart, name='remove-from-cart'),
+    path('remove-product/<int:product_id>/', views.remove_product_from_cart, name='remove-product-from-cart'),
+    path('update/', views.update_cart, name='update-cart'),
+    # Same view as orders' checkout: there is one checkout path
+    path('checkout/', order_views.checkout, name='cart-checkout'),
 ]
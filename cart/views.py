@@ -1,53 +1,67 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from cart.models import Cart, CartItem
+import json
+
+from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from store.models import Product
-from orders.models import Order, OrderItem
+from django.http import Http404, JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from cart import mutations
+from cart.storage import get_cart
+
+def _next_url(request, default="cart-view"):
+    """Where to go after a mutation: a safe ``next`` parameter or the cart page"""
+    next_url = request.POST.get('next') or request.GET.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return next_url
+    return default
 
-@login_required
 def cart_view(request):
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
-    total_price = sum(item.get_total_price() for item in cart_items)
+    cart = get_cart(request)
+    cart_items = cart.lines()
+    total_price = cart.total(cart_items)
     return render(request, "cart/cart.html", {"cart_items": cart_items, "total_price": total_price})
 
-@login_required
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    cart, created = Cart.objects.get_or_create(user=request.user)
+    # One upsert (or a cookie update when logged out); concurrent clicks each add their unit
+    result = get_cart(request).add({product_id: 1})
+    if result['rejected']:
+        raise Http404("Product not available")
+    messages.success(request, f"Added {result['names'][product_id]} to your cart.")
+    return redirect(_next_url(request))
 
-    cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
+@require_POST
+def update_cart(request):
+    """
+    Add to and/or set many cart lines at once. Body (JSON):
+    ``{"add": {"<product_id>": n}, "set": {"<product_id>": n}}``; a set
+    quantity of 0 removes the line.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        adds = mutations.parse_quantities(payload.get('add', {}))
+        sets = mutations.parse_quantities(payload.get('set', {}), allow_zero=True)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid cart update: {e}'}, status=400)
 
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    cart = get_cart(request)
+    added = cart.add(adds)
+    updated = cart.set(sets)
+    rejected = sorted(set(added['rejected']) | set(updated['rejected']))
+    return JsonResponse({
+        'success': not rejected,
+        'message': 'Cart updated' if not rejected else 'Some products are not available',
+        'added': added['lines'],
+        'set': updated['lines'],
+        'rejected': rejected,
+    })
 
+def remove_product_from_cart(request, product_id):
+    get_cart(request).set({product_id: 0})
     return redirect("cart-view")
 
 @login_required
 def remove_from_cart(request, item_id):
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    cart_item.delete()
+    if not mutations.remove_item(request.user, item_id):
+        raise Http404("No such cart item")
     return redirect("cart-view")
-
-@login_required
-def checkout(request):
-    cart = get_object_or_404(Cart, user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
-
-    if not cart_items:
-        return redirect("cart-view")  # nothing to checkout
-
-    if request.method == "POST":
-        order = Order.objects.create(user=request.user)
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                quantity=item.quantity
-            )
-        cart_items.delete()  # clear cart after placing order
-        return redirect("order-list")
-
-    total_price = sum(item.get_total_price() for item in cart_items)
-    return render(request, "cart/checkout.html", {"cart_items": cart_items, "total_price": total_price})
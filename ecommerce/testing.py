@@ -0,0 +1,61 @@
+"""
+Shared helpers for the apps' test suites.
+
+``ShopTestCase`` and ``ShopTransactionTestCase`` run with a local-memory cache
+(cleared before every test) instead of the file cache, and a fast password
+hasher. The ``make_*`` functions create the users and products most tests
+start from.
+"""
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.text import slugify
+
+from accounts.models import CustomUser
+from cart.models import Cart, CartItem
+from store.models import Product
+
+LOCMEM_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+test_settings = override_settings(CACHES=LOCMEM_CACHE, PASSWORD_HASHERS=FAST_HASHERS)
+
+
+class _ClearCache:
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+@test_settings
+class ShopTestCase(_ClearCache, TestCase):
+    pass
+
+
+@test_settings
+class ShopTransactionTestCase(_ClearCache, TransactionTestCase):
+    pass
+
+
+def make_seller(username='seller'):
+    return CustomUser.objects.create_user(username, password='pw', role='seller')
+
+
+def make_customer(username='customer'):
+    return CustomUser.objects.create_user(username, password='pw', role='customer')
+
+
+def make_product(seller, name='Widget', **fields):
+    """A product of ``seller``; the slug follows the name unless given"""
+    fields.setdefault('slug', slugify(name))
+    fields.setdefault('description', '')
+    fields.setdefault('price', 10)
+    fields.setdefault('stock', 100)
+    return Product.objects.create(seller=seller, name=name, **fields)
+
+
+def make_customer_with_cart(username, product, quantity=1):
+    customer = make_customer(username)
+    cart = Cart.objects.create(user=customer)
+    CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+    return customer
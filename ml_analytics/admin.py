@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ReviewSentiment, SentimentTrainingData, ModelTrainingLog
+from .models import ReviewSentiment, SentimentTrainingData, ModelTrainingLog, ProductRecommendation
 
 
 @admin.register(ReviewSentiment)
@@ -76,3 +76,13 @@ class ModelTrainingLogAdmin(admin.ModelAdmin):
             'fields': ('training_started_at', 'training_completed_at')
         }),
     )
+
+
+@admin.register(ProductRecommendation)
+class ProductRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['product', 'source', 'rank', 'recommended', 'score', 'updated_at']
+    list_filter = ['source']
+    search_fields = ['product__name', 'recommended__name']
+    list_select_related = ['product', 'recommended']
+    readonly_fields = ['updated_at']
+    list_per_page = 25
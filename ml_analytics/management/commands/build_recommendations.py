@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from ml_analytics.recommendations import CoPurchaseRecommender, DEFAULT_TOP_K
+
+
+class Command(BaseCommand):
+    help = 'Build or incrementally refresh "customers also bought" recommendations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild from the whole order history instead of only new orders',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=DEFAULT_TOP_K,
+            help='Recommendations kept per product',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Refreshing co-purchase recommendations...'))
+
+        stats = CoPurchaseRecommender(top_k=options['top_k']).refresh(full=options['full'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nRecommendations refreshed!\n'
+                f'Orders folded in up to: #{stats["orders_after"]}\n'
+                f'Products updated: {stats["products_updated"]}\n'
+                f'Recommendations written: {stats["recommendations"]}'
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from ml_analytics.related_products import RelatedProductsIndex, DEFAULT_TOP_K, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the content-based related-products index from product text'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=DEFAULT_TOP_K,
+            help='Related products kept per product',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Products scored per similarity block (bounds memory use)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding related products index...'))
+
+        index = RelatedProductsIndex(top_k=options['top_k'], chunk_size=options['chunk_size'])
+        stats = index.rebuild()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nRelated products index rebuilt!\n'
+                f'Products indexed: {stats["products"]}\n'
+                f'Recommendations written: {stats["recommendations"]}'
+            )
+        )
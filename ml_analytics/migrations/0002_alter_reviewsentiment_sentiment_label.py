@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reviewsentiment',
+            name='sentiment_label',
+            field=models.CharField(choices=[('positive', 'Positive'), ('negative', 'Negative'), ('neutral', 'Neutral')], db_index=True, help_text='Predicted sentiment label', max_length=10),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_analytics', '0002_alter_reviewsentiment_sentiment_label'),
+        ('store', '0007_product_image_height_product_image_variants_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('copurchase', 'Customers also bought')], max_length=20)),
+                ('rank', models.PositiveSmallIntegerField(help_text='1 = most similar')),
+                ('score', models.FloatField(help_text='Similarity score (higher is more similar)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='store.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.product')),
+            ],
+            options={
+                'verbose_name': 'Product Recommendation',
+                'verbose_name_plural': 'Product Recommendations',
+                'ordering': ['product', 'source', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('product', 'source', 'rank'), name='unique_recommendation_rank')],
+            },
+        ),
+    ]
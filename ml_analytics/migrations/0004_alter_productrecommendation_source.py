@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ml_analytics', '0003_productrecommendation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productrecommendation',
+            name='source',
+            field=models.CharField(choices=[('copurchase', 'Customers also bought'), ('content', 'Related products')], max_length=20),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-from store.models import Review
+from store.models import Product, Review
 
 
 class ReviewSentiment(models.Model):
@@ -21,6 +21,7 @@ class ReviewSentiment(models.Model):
     sentiment_label = models.CharField(
         max_length=10, 
         choices=SENTIMENT_CHOICES,
+        db_index=True,
         help_text="Predicted sentiment label"
     )
     confidence_score = models.FloatField(
@@ -140,3 +141,37 @@ class ModelTrainingLog(models.Model):
     def __str__(self):
         status = "Completed" if self.training_completed_at else "In Progress"
         return f"Training {self.model_version} - {status}"
+
+
+class ProductRecommendation(models.Model):
+    """Precomputed top-K similar products, read by product pages with one indexed lookup"""
+    SOURCE_CHOICES = [
+        ('copurchase', 'Customers also bought'),
+        ('content', 'Related products'),
+    ]
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    recommended = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    rank = models.PositiveSmallIntegerField(help_text="1 = most similar")
+    score = models.FloatField(help_text="Similarity score (higher is more similar)")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Product Recommendation"
+        verbose_name_plural = "Product Recommendations"
+        ordering = ['product', 'source', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'source', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.source} #{self.rank})"
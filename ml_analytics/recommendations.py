@@ -0,0 +1,209 @@
+"""
+"Customers also bought" recommendations from order history.
+
+An order x product incidence matrix is built from ``OrderItem`` rows and
+multiplied out into a sparse item-item co-occurrence matrix with SciPy. The
+co-occurrence counts are cosine-normalised and the top-K neighbours of each
+product are written to ``ProductRecommendation``, so product pages read them
+with one indexed query instead of computing anything per request.
+
+The co-occurrence matrix is persisted to ``ml_models/`` together with the id
+of the last order folded in, so later runs only scan new orders and only
+recompute the products whose neighbourhood changed.
+"""
+
+import logging
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from orders.models import OrderItem
+from store.models import Product
+from .models import ProductRecommendation
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'copurchase'
+DEFAULT_TOP_K = 10
+# Orders younger than this may still be committing their items
+SETTLE_SECONDS = 60
+
+
+class CoPurchaseRecommender:
+    """Item-item co-purchase model over a persisted sparse co-occurrence matrix"""
+
+    def __init__(self, top_k=DEFAULT_TOP_K):
+        self.model_dir = Path(settings.BASE_DIR) / 'ml_models'
+        self.model_dir.mkdir(exist_ok=True)
+        self.matrix_path = self.model_dir / 'copurchase_matrix.npz'
+        self.top_k = top_k
+
+    def load_state(self):
+        """Return ``(cooccurrence_csr, last_order_id)``, empty if never built"""
+        if not self.matrix_path.exists():
+            return sparse.csr_matrix((0, 0), dtype=np.int32), 0
+        with np.load(self.matrix_path) as state:
+            shape = tuple(state['shape'])
+            matrix = sparse.csr_matrix(
+                (state['data'], state['indices'], state['indptr']), shape=shape
+            )
+            return matrix, int(state['last_order_id'])
+
+    def save_state(self, matrix, last_order_id):
+        # Write next to the target and rename so readers never see a partial file
+        temp_path = self.matrix_path.with_suffix('.tmp.npz')
+        np.savez_compressed(
+            temp_path,
+            data=matrix.data,
+            indices=matrix.indices,
+            indptr=matrix.indptr,
+            shape=np.array(matrix.shape),
+            last_order_id=np.array(last_order_id),
+        )
+        temp_path.replace(self.matrix_path)
+
+    def basket_cooccurrence(self, after_order_id=0):
+        """
+        Co-occurrence counts for settled, non-cancelled orders with
+        ``id > after_order_id``. Returns ``(csr, last_order_id)``.
+        """
+        cutoff = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+        pairs = (
+            OrderItem.objects.filter(order_id__gt=after_order_id, order__order_date__lte=cutoff)
+            .exclude(order__status='cancelled')
+            .values_list('order_id', 'product_id')
+            .iterator(chunk_size=5000)
+        )
+        flat = np.fromiter((value for pair in pairs for value in pair), dtype=np.int64)
+        if not flat.size:
+            return sparse.csr_matrix((0, 0), dtype=np.int32), after_order_id
+
+        order_ids, product_ids = flat[0::2], flat[1::2]
+        rows = np.unique(order_ids, return_inverse=True)[1]
+        # Products are indexed by primary key directly; the matrix is sparse so
+        # gaps in the id space cost nothing beyond the indptr array
+        size = int(product_ids.max()) + 1
+        baskets = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, product_ids)),
+            shape=(int(rows.max()) + 1, size),
+        )
+        # Buying two of something in one order still counts once
+        baskets.data[:] = 1
+        cooccurrence = (baskets.T @ baskets).tocsr()
+        return cooccurrence.astype(np.int32), int(order_ids.max())
+
+    def top_neighbours(self, matrix, product_ids):
+        """Cosine top-K neighbours for each id in ``product_ids``"""
+        counts = matrix.diagonal().astype(np.float64)
+        results = {}
+        for product_id in product_ids:
+            start, end = matrix.indptr[product_id], matrix.indptr[product_id + 1]
+            columns = matrix.indices[start:end]
+            together = matrix.data[start:end].astype(np.float64)
+            keep = columns != product_id
+            columns, together = columns[keep], together[keep]
+            if not columns.size or not counts[product_id]:
+                results[product_id] = []
+                continue
+            scores = together / np.sqrt(counts[product_id] * counts[columns])
+            k = min(self.top_k, scores.size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.lexsort((columns[best], -scores[best]))]
+            results[product_id] = [(int(columns[i]), float(scores[i])) for i in best]
+        return results
+
+    def write_recommendations(self, neighbours, replace_all=False):
+        """Replace stored recommendations for the given products (or all of them)"""
+        product_ids = list(neighbours)
+        # The matrix remembers products that have since been deleted; skip them
+        candidates = sorted(set(product_ids).union(
+            recommended_id for items in neighbours.values() for recommended_id, _ in items
+        ))
+        existing = set()
+        for start in range(0, len(candidates), 5000):
+            existing.update(
+                Product.objects.filter(id__in=candidates[start:start + 5000]).values_list('id', flat=True)
+            )
+
+        rows = [
+            ProductRecommendation(
+                product_id=product_id, recommended_id=recommended_id,
+                source=SOURCE, rank=rank, score=score,
+            )
+            for product_id, items in neighbours.items() if product_id in existing
+            for rank, (recommended_id, score) in enumerate(
+                (item for item in items if item[0] in existing), start=1
+            )
+        ]
+        with transaction.atomic():
+            if replace_all:
+                ProductRecommendation.objects.filter(source=SOURCE).delete()
+            else:
+                for start in range(0, len(product_ids), 5000):
+                    ProductRecommendation.objects.filter(
+                        source=SOURCE, product_id__in=product_ids[start:start + 5000]
+                    ).delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=2000)
+        return len(rows)
+
+    def refresh(self, full=False):
+        """
+        Fold new orders into the model and rewrite affected recommendations.
+
+        ``full=True`` rebuilds from all history (also picks up cancellations
+        of orders that were already folded in).
+        """
+        if full:
+            matrix, last_order_id = sparse.csr_matrix((0, 0), dtype=np.int32), 0
+        else:
+            matrix, last_order_id = self.load_state()
+
+        delta, new_last_order_id = self.basket_cooccurrence(after_order_id=last_order_id)
+        if not delta.nnz and not full:
+            return {'orders_after': last_order_id, 'products_updated': 0, 'recommendations': 0}
+
+        size = max(matrix.shape[0], delta.shape[0])
+        matrix.resize((size, size))
+        delta.resize((size, size))
+        matrix = (matrix + delta).tocsr()
+
+        if full:
+            affected = np.flatnonzero(np.diff(matrix.indptr))
+        else:
+            # A product's scores change when its own counts change or when a
+            # neighbour's counts change (cosine normalisation), so recompute both
+            touched = np.flatnonzero(np.diff(delta.indptr))
+            affected = np.union1d(touched, matrix[touched].indices)
+
+        neighbours = self.top_neighbours(matrix, affected.tolist())
+        written = self.write_recommendations(neighbours, replace_all=full)
+        self.save_state(matrix, new_last_order_id)
+
+        logger.info(
+            f"Co-purchase model refreshed: {len(neighbours)} products, "
+            f"{written} recommendations, orders up to #{new_last_order_id}"
+        )
+        return {
+            'orders_after': new_last_order_id,
+            'products_updated': len(neighbours),
+            'recommendations': written,
+        }
+
+
+def product_recommendations(product, limit=DEFAULT_TOP_K):
+    """
+    Recommended products for a product page, keyed by source
+    (``copurchase``, ``content``). One indexed query for all sources.
+    """
+    grouped = {source: [] for source, _ in ProductRecommendation.SOURCE_CHOICES}
+    recommendations = ProductRecommendation.objects.filter(
+        product=product, rank__lte=limit, recommended__available=True
+    ).select_related('recommended').order_by('source', 'rank')
+    for recommendation in recommendations:
+        grouped[recommendation.source].append(recommendation.recommended)
+    return grouped
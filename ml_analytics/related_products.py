@@ -0,0 +1,287 @@
+"""
+Content-based "related products" index.
+
+Products are embedded as TF-IDF vectors of their name, category and
+description, cleaned with the same preprocessing as the sentiment model.
+Vectors are L2-normalised, so cosine similarity is a sparse dot product; the
+top-K neighbours are computed in row chunks so memory stays bounded however
+large the catalogue is, and written to ``ProductRecommendation`` next to the
+co-purchase results. New and edited products are folded into the saved index
+without refitting; a periodic ``build_related_products`` run refits the
+vocabulary and IDF weights.
+
+Writers hold an exclusive lock on a file next to the index, so web workers
+and the rebuild command never interleave their updates. The loaded index is
+kept in memory and only read again once another process has replaced it.
+"""
+
+import fcntl
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import joblib
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from store.models import Product
+from .models import ProductRecommendation
+from .sentiment_analyzer import sentiment_analyzer
+
+logger = logging.getLogger(__name__)
+
+SOURCE = 'content'
+DEFAULT_TOP_K = 10
+CHUNK_SIZE = 500
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-products')
+
+
+def product_document(name, category, description):
+    """Text used to embed a product; the name is repeated to weight it up"""
+    text = f"{name} {name} {category or ''} {description or ''}"
+    return sentiment_analyzer.preprocess_text(text)
+
+
+class RelatedProductsIndex:
+    """TF-IDF product vectors plus chunked top-K cosine similarity"""
+
+    def __init__(self, top_k=DEFAULT_TOP_K, chunk_size=CHUNK_SIZE):
+        self.model_dir = Path(settings.BASE_DIR) / 'ml_models'
+        self.model_dir.mkdir(exist_ok=True)
+        self.index_path = self.model_dir / 'related_products_index.pkl'
+        self.lock_path = self.model_dir / 'related_products_index.lock'
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        # Last loaded or saved index, and the file it came from
+        self._state = None
+        self._state_file = None
+
+    @contextmanager
+    def _lock(self):
+        """One writer at a time across threads and processes"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _documents(self, product_ids=None):
+        queryset = Product.objects.order_by('id')
+        if product_ids is not None:
+            queryset = queryset.filter(id__in=product_ids)
+        rows = queryset.values_list('id', 'name', 'category__name', 'description').iterator(chunk_size=2000)
+        ids, documents = [], []
+        for product_id, name, category, description in rows:
+            ids.append(product_id)
+            documents.append(product_document(name, category, description))
+        return np.array(ids, dtype=np.int64), documents
+
+    def _file_identity(self):
+        # Every save replaces the file, so a new inode means a new index
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _save(self, state):
+        self._state = None  # not trusted again until the write succeeds
+        temp_path = self.index_path.with_suffix('.tmp')
+        joblib.dump(state, temp_path)
+        temp_path.replace(self.index_path)
+        self._state, self._state_file = state, self._file_identity()
+
+    def _load(self):
+        """The saved index, read from disk only if it changed since last time"""
+        identity = self._file_identity()
+        if identity is None:
+            self._state = None
+            return None
+        if self._state is None or identity != self._state_file:
+            self._state, self._state_file = joblib.load(self.index_path), identity
+        return self._state
+
+    def top_neighbours(self, vectors, matrix, ids, rows):
+        """Top-K cosine neighbours of ``vectors`` (one per entry of ``rows``)"""
+        results = {}
+        for start in range(0, vectors.shape[0], self.chunk_size):
+            # chunk x N similarities; only this slice is ever materialised
+            similarities = (vectors[start:start + self.chunk_size] @ matrix.T).tocsr()
+            for offset in range(similarities.shape[0]):
+                row = rows[start + offset]
+                begin, end = similarities.indptr[offset], similarities.indptr[offset + 1]
+                columns = similarities.indices[begin:end]
+                scores = similarities.data[begin:end]
+                keep = (columns != row) & (scores > 0)
+                columns, scores = columns[keep], scores[keep]
+                if not columns.size:
+                    results[int(ids[row])] = []
+                    continue
+                k = min(self.top_k, scores.size)
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best], kind='stable')]
+                results[int(ids[row])] = [(int(ids[columns[i]]), float(scores[i])) for i in best]
+        return results
+
+    def _write(self, neighbours, replace_all=False):
+        rows = [
+            ProductRecommendation(
+                product_id=product_id, recommended_id=recommended_id,
+                source=SOURCE, rank=rank, score=score,
+            )
+            for product_id, items in neighbours.items()
+            for rank, (recommended_id, score) in enumerate(items, start=1)
+        ]
+        product_ids = list(neighbours)
+        with transaction.atomic():
+            if replace_all:
+                ProductRecommendation.objects.filter(source=SOURCE).delete()
+            else:
+                for start in range(0, len(product_ids), 5000):
+                    ProductRecommendation.objects.filter(
+                        source=SOURCE, product_id__in=product_ids[start:start + 5000]
+                    ).delete()
+            ProductRecommendation.objects.bulk_create(rows, batch_size=2000)
+        return len(rows)
+
+    def rebuild(self):
+        """Refit the vectorizer on the whole catalogue and rewrite all neighbours"""
+        with self._lock():
+            ids, documents = self._documents()
+            vectorizer = TfidfVectorizer(
+                max_features=20000,
+                stop_words='english',
+                ngram_range=(1, 2),
+                max_df=0.8,
+                sublinear_tf=True,
+                dtype=np.float32,
+            )
+            try:
+                matrix = vectorizer.fit_transform(documents).tocsr()
+            except ValueError:
+                # Empty catalogue or nothing left after stop words
+                logger.info("Related products index: no usable product text")
+                self._write({}, replace_all=True)
+                return {'products': len(ids), 'recommendations': 0}
+
+            neighbours = self.top_neighbours(matrix, matrix, ids, list(range(len(ids))))
+            written = self._write(neighbours, replace_all=True)
+            self._save({
+                'vectorizer': vectorizer,
+                'matrix': matrix,
+                'ids': ids,
+                'hashes': {int(pid): self._hash(doc) for pid, doc in zip(ids, documents)},
+            })
+            return {'products': len(ids), 'recommendations': written}
+
+    @staticmethod
+    def _hash(document):
+        return hashlib.md5(document.encode()).hexdigest()
+
+    def update_product(self, product_id):
+        """
+        Fold one new or edited product into the saved index and refresh the
+        neighbour lists it enters or leaves.
+        """
+        with self._lock():
+            state = self._load()
+            if state is None:
+                return None
+
+            ids, documents = self._documents([product_id])
+            if not len(ids):
+                return None
+            document = documents[0]
+            if state['hashes'].get(product_id) == self._hash(document):
+                return None  # text unchanged (price/stock edit)
+
+            vector = state['vectorizer'].transform([document]).astype(np.float32).tocsr()
+            matrix, all_ids = state['matrix'], state['ids']
+            positions = np.flatnonzero(all_ids == product_id)
+            if positions.size:
+                row = int(positions[0])
+                matrix = sparse.vstack([matrix[:row], vector, matrix[row + 1:]]).tocsr()
+            else:
+                row = len(all_ids)
+                matrix = sparse.vstack([matrix, vector]).tocsr()
+                all_ids = np.append(all_ids, product_id)
+
+            # Products whose lists could change: those that listed this product
+            # before, and those for which it now scores above their K-th entry
+            similarities = (vector @ matrix.T).toarray().ravel()
+            scored = np.flatnonzero(similarities > 0)
+            candidates = [int(pid) for pid in all_ids[scored] if pid != product_id]
+            current = {}
+            for start in range(0, len(candidates), 5000):
+                current.update(
+                    ProductRecommendation.objects.filter(
+                        source=SOURCE, rank=self.top_k, product_id__in=candidates[start:start + 5000]
+                    ).values_list('product_id', 'score')
+                )
+            affected = set(
+                ProductRecommendation.objects.filter(source=SOURCE, recommended_id=product_id)
+                .values_list('product_id', flat=True)
+            )
+            for position in scored:
+                other = int(all_ids[position])
+                if other != product_id and similarities[position] > current.get(other, 0.0):
+                    affected.add(other)
+
+            index_of = {int(pid): i for i, pid in enumerate(all_ids)}
+            rows = [row] + [index_of[pid] for pid in affected if pid in index_of]
+            neighbours = self.top_neighbours(matrix[rows], matrix, all_ids, rows)
+            self._write(neighbours)
+
+            state.update(matrix=matrix, ids=all_ids)
+            state['hashes'][product_id] = self._hash(document)
+            self._save(state)
+            return {'products_updated': len(neighbours)}
+
+    def remove_product(self, product_id):
+        """
+        Drop a deleted product's row. Its recommendation rows go with it by
+        cascade; lists it leaves short are refilled by the next rebuild.
+        """
+        with self._lock():
+            state = self._load()
+            if state is None:
+                return
+            keep = state['ids'] != product_id
+            if keep.all():
+                return
+            state['matrix'] = state['matrix'][np.flatnonzero(keep)]
+            state['ids'] = state['ids'][keep]
+            state['hashes'].pop(product_id, None)
+            self._save(state)
+
+
+related_products_index = RelatedProductsIndex()
+
+
+def _run_in_background(method, product_id):
+    try:
+        method(product_id)
+    except Exception as e:
+        logger.error(f"Error updating related products for product {product_id}: {e}")
+    finally:
+        connection.close()
+
+
+def queue_related_products_update(product_id):
+    """Fold a saved product into the index after the transaction commits"""
+    transaction.on_commit(
+        lambda: _executor.submit(_run_in_background, related_products_index.update_product, product_id)
+    )
+
+
+def queue_related_products_removal(product_id):
+    transaction.on_commit(
+        lambda: _executor.submit(_run_in_background, related_products_index.remove_product, product_id)
+    )
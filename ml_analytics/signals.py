@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from store.models import Review
+from store.models import Product, Review
 from .models import ReviewSentiment
+from .related_products import queue_related_products_removal, queue_related_products_update
 from .sentiment_analyzer import analyze_review_sentiment
 import logging
 
@@ -50,3 +51,16 @@ def analyze_review_sentiment_signal(sender, instance, created, **kwargs):
     except Exception as e:
         logger.error(f"Error analyzing sentiment for review {instance.id}: {e}")
         # Don't raise the exception to avoid breaking the review creation process
+
+
+@receiver(post_save, sender=Product)
+def update_related_products_signal(sender, instance, **kwargs):
+    """
+    Fold new or edited products into the related-products index (in the background)
+    """
+    queue_related_products_update(instance.id)
+
+
+@receiver(post_delete, sender=Product)
+def remove_related_products_signal(sender, instance, **kwargs):
+    queue_related_products_removal(instance.id)
@@ -1,3 +1,134 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.utils import timezone
+
+from cart.models import CartItem
+from ecommerce.testing import ShopTestCase, make_customer_with_cart, make_product, make_seller
+from ml_analytics.models import ProductRecommendation
+from ml_analytics.recommendations import CoPurchaseRecommender, product_recommendations
+from ml_analytics.related_products import RelatedProductsIndex
+from orders import checkout
+from orders.models import Order
+
+
+class ModelDirTestCase(ShopTestCase):
+    """Keeps the models a test builds out of the project's ml_models/"""
+
+    def setUp(self):
+        super().setUp()
+        base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, base_dir, ignore_errors=True)
+        settings_override = self.settings(BASE_DIR=base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def recommendations(self, source):
+        return list(
+            ProductRecommendation.objects.filter(source=source)
+            .order_by('product_id', 'rank')
+            .values_list('product_id', 'recommended_id', 'rank', 'score')
+        )
+
+
+class CoPurchaseRecommenderTests(ModelDirTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.products = [make_product(seller, f'Item {number}', price=5) for number in range(5)]
+        self.customers = 0
+
+    def order(self, *indexes, settled=True):
+        self.customers += 1
+        first, *others = [self.products[index] for index in indexes]
+        customer = make_customer_with_cart(f'customer{self.customers}', first)
+        CartItem.objects.bulk_create([CartItem(cart=customer.cart, product=product) for product in others])
+        order = checkout.place_order(customer, checkout.load_cart_lines(customer))
+        if settled:
+            Order.objects.filter(id=order.id).update(order_date=timezone.now() - timedelta(minutes=5))
+        return order
+
+    def test_incremental_refresh_matches_a_full_rebuild(self):
+        self.order(0, 1)
+        self.order(0, 2)
+        self.order(1, 2, 3)
+        CoPurchaseRecommender().refresh()
+        self.order(0, 1)
+        self.order(3, 4)
+        self.order(0, 4)
+        stats = CoPurchaseRecommender().refresh()
+        self.assertEqual(stats['orders_after'], Order.objects.latest('id').id)
+        incremental = self.recommendations('copurchase')
+
+        CoPurchaseRecommender().refresh(full=True)
+        self.assertEqual(self.recommendations('copurchase'), incremental)
+        self.assertEqual(CoPurchaseRecommender().refresh()['products_updated'], 0)
+
+    def test_cancelled_and_unsettled_orders_are_left_out(self):
+        self.order(0, 1).cancel_order()
+        self.order(0, 2, settled=False)
+        CoPurchaseRecommender().refresh()
+        self.assertEqual(self.recommendations('copurchase'), [])
+
+    def test_product_page_reads_neighbours_by_score(self):
+        self.order(0, 1)
+        self.order(0, 1)
+        self.order(0, 2)
+        self.order(2, 3)
+        CoPurchaseRecommender().refresh()
+        first, second, third = self.products[:3]
+        with self.assertNumQueries(1):
+            recommended = product_recommendations(first)
+        self.assertEqual(recommended, {'copurchase': [second, third], 'content': []})
+
+
+class RelatedProductsTests(ModelDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.shirt = make_product(self.seller, 'Red cotton shirt', description='Soft cotton shirt for summer')
+        self.blouse = make_product(self.seller, 'Blue cotton blouse', description='Light cotton top for summer')
+        self.hammer = make_product(self.seller, 'Claw hammer', description='Steel hammer for nails')
+        self.mallet = make_product(self.seller, 'Rubber mallet', description='Hammer for tiles and nails')
+
+    def neighbours(self, product):
+        return list(
+            ProductRecommendation.objects.filter(source='content', product=product)
+            .order_by('rank').values_list('recommended_id', flat=True)
+        )
+
+    def test_rebuild_pairs_products_with_similar_text(self):
+        stats = RelatedProductsIndex().rebuild()
+        self.assertEqual(stats['products'], 4)
+        self.assertEqual(self.neighbours(self.shirt), [self.blouse.id])
+        self.assertEqual(self.neighbours(self.mallet), [self.hammer.id])
+
+    def test_new_and_edited_products_are_folded_in(self):
+        index = RelatedProductsIndex()
+        index.rebuild()
+        sledge = make_product(self.seller, 'Sledge hammer', description='Heavy steel hammer')
+        with mock.patch('ml_analytics.related_products.joblib.load') as load:
+            self.assertEqual(index.update_product(sledge.id)['products_updated'], 3)
+        load.assert_not_called()  # the index built above stays in memory
+        self.assertIn(sledge.id, RelatedProductsIndex()._load()['ids'])  # and on disk for other processes
+        self.assertEqual(self.neighbours(sledge)[0], self.hammer.id)
+        self.assertIn(sledge.id, self.neighbours(self.hammer))
+
+        self.assertIsNone(index.update_product(sledge.id))  # text unchanged
+        sledge.description = 'Cotton shirt for summer'
+        sledge.name = 'Summer shirt'
+        sledge.save()
+        index.update_product(sledge.id)
+        self.assertNotIn(sledge.id, self.neighbours(self.hammer))
+        self.assertIn(self.shirt.id, self.neighbours(sledge))
+
+    def test_removed_product_leaves_the_index(self):
+        index = RelatedProductsIndex()
+        index.rebuild()
+        hammer_id = self.hammer.id
+        self.hammer.delete()
+        index.remove_product(hammer_id)
+        self.assertEqual(self.neighbours(self.mallet), [])
+        self.assertNotIn(hammer_id, index._load()['ids'])
@@ -1,9 +1,40 @@
+from django import forms
 from django.contrib import admin
-from .models import Order, OrderItem, ShippingMethod, Address
+from .models import Order, OrderItem, ShippingMethod, Address, StockReservation, IdempotencyKey, SellerOrder, OrderStatusHistory
+from .transitions import TRANSITIONS
 
 # Register your models here.
 
-admin.site.register(Order)
+
+class OrderAdminForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = '__all__'
+
+    def clean_status(self):
+        status = self.cleaned_data['status']
+        previous = self.initial.get('status')
+        if self.instance.pk and status != previous and status not in TRANSITIONS[previous]:
+            raise forms.ValidationError(f"An order cannot move from {previous} to {status}.")
+        return status
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    form = OrderAdminForm
+    list_display = ['id', 'customer_name', 'status', 'total_amount', 'order_date']
+    list_filter = ['status', 'order_date']
+    search_fields = ['customer_name', 'customer_email']
+
+    def save_model(self, request, obj, form, change):
+        # Status edits go through the state machine (see Order.save)
+        obj.save(changed_by=request.user, reason='Changed in admin')
+
+
 admin.site.register(OrderItem)
 admin.site.register(ShippingMethod)
 admin.site.register(Address)
+admin.site.register(StockReservation)
+admin.site.register(IdempotencyKey)
+admin.site.register(SellerOrder)
+admin.site.register(OrderStatusHistory)
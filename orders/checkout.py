@@ -0,0 +1,89 @@
+"""
+Checkout service: turn a customer's cart into an order.
+
+This is the only checkout code path; both the ``/cart/checkout/`` and
+``/orders/checkout/`` routes use it through ``orders.views.checkout``, and
+the cart page uses the same loader and total.
+
+The cart is read once, with its products joined in and each line's total and
+the cart subtotal computed by the database, and the same line objects are
+used for the displayed total, the price snapshot on each ``OrderItem`` and
+the stock claim. Placing the order is a fixed number of statements whatever
+the cart size (one stock UPDATE, one ``bulk_create`` each for the items and
+the per-seller index rows, one upsert of the daily sales rollups, one DELETE
+for the cart lines) and all of them run in one transaction, so a failure
+part-way leaves no half-written order behind.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, Window
+
+from cart import summary
+from cart.models import CartItem
+from payments.models import Payment
+from . import customer_stats, inventory, rollups, seller_index
+from .models import Order, OrderItem
+
+DEFAULT_PAYMENT_METHOD = 'cash'
+
+
+def load_cart_lines(user):
+    """The user's cart items with their products, line totals and subtotal (one query)"""
+    return list(
+        CartItem.objects.filter(cart__user=user)
+        .select_related('product')
+        .annotate(line_total=summary.LINE_TOTAL, cart_subtotal=Window(Sum(summary.LINE_TOTAL)))
+        .order_by('id')
+    )
+
+
+def cart_total(lines):
+    if lines and hasattr(lines[0], 'cart_subtotal'):
+        return lines[0].cart_subtotal
+    return sum((item.get_total_price() for item in lines), Decimal('0.00'))
+
+
+@transaction.atomic
+def place_order(user, lines, shipping_address='', phone_number='', payment_method=DEFAULT_PAYMENT_METHOD):
+    """
+    Write the order, its items and payment and clear the ordered cart lines.
+
+    Prices are taken from ``lines`` as loaded, i.e. what the customer saw.
+    Raises ``inventory.InsufficientStock`` (writing nothing) if a line is short.
+    """
+    if payment_method not in dict(Payment.PAYMENT_METHODS):
+        payment_method = DEFAULT_PAYMENT_METHOD
+
+    inventory.claim(user, [(item.product_id, item.quantity) for item in lines])
+
+    total_amount = cart_total(lines)
+    order = Order.objects.create(
+        user=user,
+        customer_name=f"{user.first_name} {user.last_name}".strip() or user.username,
+        customer_email=user.email,
+        shipping_address=shipping_address,
+        phone_number=phone_number,
+        total_amount=total_amount,
+        status='pending'
+    )
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=item.product_id, quantity=item.quantity, price=item.product.price)
+        for item in lines
+    ])
+    shares = seller_index.record(order, [(item.product.seller_id, item.quantity, item.product.price) for item in lines])
+    rollups.record_order(order, shares)
+    # For Cash on Delivery the payment stays pending until delivery
+    Payment.objects.create(
+        user=user,
+        order=order,
+        amount=total_amount,
+        payment_method=payment_method,
+        status='pending'
+    )
+    # Only the lines that were ordered: anything added meanwhile stays in the cart
+    CartItem.objects.filter(id__in=[item.id for item in lines]).delete()
+    summary.invalidate(user.id)
+    customer_stats.invalidate(user.id)
+    return order
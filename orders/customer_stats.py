@@ -0,0 +1,49 @@
+"""
+Customer dashboard statistics, cached per user.
+
+The counts and the amount spent come from one conditional-aggregate query
+over the customer's orders, stored together with their few most recent
+orders. Checkout, status transitions and order saves drop the entry once
+their transaction commits; the cart figures come from the separately cached
+cart summary (``cart.summary``).
+"""
+
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Order
+
+STATS_TIMEOUT = 60 * 15
+RECENT_ORDERS = 5
+
+
+def _key(user_id):
+    return f"customer-stats:{user_id}"
+
+
+def customer_stats(user_id):
+    """Order counts, ``total_spent`` and ``recent_orders`` (as dicts) for a customer"""
+    stats = cache.get(_key(user_id))
+    if stats is None:
+        orders = Order.objects.filter(user_id=user_id)
+        stats = orders.aggregate(
+            total_orders=Count('id'),
+            pending_orders=Count('id', filter=Q(status='pending')),
+            completed_orders=Count('id', filter=Q(status='delivered')),
+            total_spent=Sum('total_amount', filter=Q(status__in=['delivered', 'shipped']), default=Decimal('0.00')),
+        )
+        stats['recent_orders'] = list(
+            orders.order_by('-order_date', '-id').values('id', 'order_date', 'status', 'total_amount')[:RECENT_ORDERS]
+        )
+        cache.set(_key(user_id), stats, STATS_TIMEOUT)
+    return stats
+
+
+def invalidate(*user_ids):
+    """Drop the customers' cached statistics once the current transaction commits"""
+    keys = [_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,72 @@
+"""
+Streaming sales exports for sellers.
+
+A seller's sales are every ``OrderItem`` of their products, which grows
+without bound. The export reads them as plain tuples (``values_list``) in
+chunks with ``iterator()`` and turns each into a CSV line as it is consumed,
+so the web response (a ``StreamingHttpResponse``) and the management command
+hold one chunk at a time whatever the size of the history.
+"""
+
+import csv
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import OrderItem
+
+CHUNK_SIZE = 2000
+HEADER = [
+    'order_id', 'order_date', 'status', 'customer', 'product_id', 'product',
+    'quantity', 'unit_price', 'line_total',
+]
+
+
+def parse_range(start, end):
+    """``(start, end)`` dates from ``YYYY-MM-DD`` strings (either may be blank); raises ValueError"""
+    dates = []
+    for value in (start, end):
+        parsed = parse_date(value) if value else None
+        if value and parsed is None:
+            raise ValueError(f"Invalid date: {value}")
+        dates.append(parsed)
+    if dates[0] and dates[1] and dates[0] > dates[1]:
+        raise ValueError("The start date is after the end date")
+    return tuple(dates)
+
+
+def sales_rows(seller, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Yield one row per item sold by ``seller`` in the (inclusive) date range, oldest first"""
+    items = OrderItem.objects.filter(product__seller=seller)
+    # Whole local days, as a range on the datetime rather than a per-row date cast
+    if start:
+        items = items.filter(order__order_date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        items = items.filter(order__order_date__lte=timezone.make_aware(datetime.combine(end, time.max)))
+    rows = items.order_by('order_id', 'id').values_list(
+        'order_id', 'order__order_date', 'order__status', 'order__customer_name',
+        'product_id', 'product__name', 'quantity', 'price',
+    )
+    for order_id, order_date, status, customer, product_id, product, quantity, price in rows.iterator(
+        chunk_size=chunk_size
+    ):
+        yield [
+            order_id, timezone.localtime(order_date).isoformat(), status, customer, product_id, product,
+            quantity, price, quantity * price,
+        ]
+
+
+class _Echo:
+    """File-like object whose write() hands the line back instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """CSV text for ``HEADER`` and ``rows``, one line at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
@@ -0,0 +1,110 @@
+"""
+Idempotency keys for order-writing POST endpoints.
+
+A client sends a unique key with each logical action, in an
+``Idempotency-Key`` header or an ``idempotency_key`` form field. The first
+request with a key records it and then runs the view in the same
+transaction, storing the response alongside the key. A double-submit or
+retry with the same key gets the stored response back without the view
+running again. A duplicate that arrives while the first request is still
+running waits on the key's unique index and is answered once that request
+commits. Keys expire after ``KEY_TTL`` and are removed by
+``purge_idempotency_keys``.
+"""
+
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_TTL = timedelta(hours=24)
+FORM_FIELD = 'idempotency_key'
+REPLAYED_HEADERS = ('Content-Type', 'Location')
+
+
+def _request_key(request):
+    key = request.META.get('HTTP_IDEMPOTENCY_KEY') or request.POST.get(FORM_FIELD) or ''
+    return key.strip()[:100]
+
+
+def _replay(record):
+    response = HttpResponse(record.response_body, status=record.response_status)
+    for header, value in record.response_headers.items():
+        response[header] = value
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(request, scope, key):
+    """Return ``(new_record, None)`` for a first request or ``(None, response)`` for a repeat"""
+    records = IdempotencyKey.objects.filter(user=request.user, scope=scope, key=key)
+    existing = records.first()
+    if existing is not None and existing.created_at < timezone.now() - KEY_TTL:
+        existing.delete()
+        existing = None
+    if existing is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=request.user, scope=scope, key=key, request_path=request.path[:255]
+                ), None
+        except IntegrityError:
+            # A concurrent duplicate committed first
+            existing = records.get()
+
+    if existing.request_path != request.path[:255]:
+        return None, JsonResponse(
+            {'success': False, 'message': 'This idempotency key was already used for a different request'},
+            status=422,
+        )
+    if existing.response_status is None:
+        return None, JsonResponse({'success': False, 'message': 'This request is still being processed'}, status=409)
+    return None, _replay(existing)
+
+
+def idempotent(view):
+    """
+    Make a POST view replay its first response for repeats of the same key.
+    Requests without a key run as before.
+    """
+    scope = view.__name__
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = _request_key(request)
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        with transaction.atomic():
+            record, response = _claim(request, scope, key)
+            if response is not None:
+                return response
+            # An exception rolls back the key with the view's writes, so a
+            # retry runs again
+            response = view(request, *args, **kwargs)
+            record.response_status = response.status_code
+            record.response_body = response.content.decode(response.charset)
+            record.response_headers = {
+                header: response[header] for header in REPLAYED_HEADERS if response.has_header(header)
+            }
+            record.save(update_fields=['response_status', 'response_body', 'response_headers'])
+            return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """Delete keys older than KEY_TTL; returns the number deleted"""
+    cutoff = timezone.now() - KEY_TTL
+    deleted = 0
+    while True:
+        batch_ids = list(
+            IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size]
+        )
+        if not batch_ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=batch_ids).delete()[0]
@@ -0,0 +1,167 @@
+"""
+Stock reservation and decrement for checkout.
+
+``Product.stock`` is the number of units on hand; only a placed order (or a
+seller's own edit) changes it. Units are taken with a conditional UPDATE
+(``SET stock = stock - n WHERE stock - held >= n``), so two checkouts racing
+for the last unit can never both succeed. Every line of an order is taken by
+the same statement, inside the transaction that writes the order, so an
+order is either fully stocked or not placed at all.
+
+Beginning checkout reserves the cart for ``RESERVATION_MINUTES`` with
+``StockReservation`` rows. A hold does not touch ``Product.stock``: the
+units under other customers' unexpired holds are subtracted when stock is
+checked, so a hold that runs out simply stops counting, and an absolute
+stock write by the seller is never inflated by a hold returned later.
+Placing the order consumes the customer's own hold. Expired rows are
+deleted by the ``release_expired_reservations`` command.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store.models import Product
+from store.signals import products_bulk_changed
+from .models import StockReservation
+
+RESERVATION_MINUTES = 15
+
+
+class InsufficientStock(Exception):
+    """One or more lines cannot be covered by the remaining stock"""
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        names = Product.objects.filter(id__in=product_ids).values_list('name', flat=True)
+        super().__init__(f"Not enough stock for: {', '.join(sorted(names))}")
+
+
+def _quantities(lines):
+    """Total quantity per product from ``(product_id, quantity)`` pairs"""
+    totals = {}
+    for product_id, quantity in lines:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    return totals
+
+
+def _stock_changed(product_ids):
+    product_ids = sorted(product_ids)
+    if product_ids:
+        transaction.on_commit(
+            lambda: products_bulk_changed.send(sender=Product, product_ids=product_ids, fields=['stock'])
+        )
+
+
+def _per_product(quantities):
+    """``CASE id WHEN ... THEN quantity END`` for one statement over all products"""
+    return Case(
+        *(When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()),
+        output_field=IntegerField(),
+    )
+
+
+def _held_by_others(user):
+    """Units of the outer product under other customers' unexpired holds"""
+    holds = (
+        StockReservation.objects.filter(product=OuterRef('pk'), expires_at__gt=timezone.now())
+        .exclude(user=user)
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(holds), Value(0), output_field=IntegerField())
+
+
+def _short(user, quantities):
+    """Products that cannot cover their quantity once other holds are set aside"""
+    rows = {
+        product_id: (stock - held if available else 0)
+        for product_id, stock, available, held in Product.objects.filter(id__in=list(quantities))
+        .annotate(held=_held_by_others(user))
+        .values_list('id', 'stock', 'available', 'held')
+    }
+    return sorted(product_id for product_id, quantity in quantities.items() if rows.get(product_id, 0) < quantity)
+
+
+def _take(user, quantities):
+    if not quantities:
+        return
+    # One UPDATE for every line, so the cost does not grow with cart size
+    needed = _per_product(quantities)
+    with transaction.atomic():
+        taken = Product.objects.filter(
+            id__in=list(quantities), available=True, stock__gte=needed + _held_by_others(user)
+        ).update(stock=F('stock') - needed)
+        if taken == len(quantities):
+            return
+        # Some line was short: undo the lines that were taken
+        transaction.set_rollback(True)
+    raise InsufficientStock(_short(user, quantities) or sorted(quantities))
+
+
+@transaction.atomic
+def reserve(user, lines, minutes=RESERVATION_MINUTES):
+    """
+    Hold stock for ``user``'s checkout, replacing any hold they already have.
+    Raises ``InsufficientStock`` (keeping the old hold) if a line is short.
+    """
+    needed = {product_id: quantity for product_id, quantity in _quantities(lines).items() if quantity > 0}
+    # Serialize holds on these products, so two customers cannot both hold the last unit
+    list(Product.objects.select_for_update().filter(id__in=list(needed)).values_list('id', flat=True))
+    short = _short(user, needed)
+    if short:
+        raise InsufficientStock(short)
+    StockReservation.objects.filter(user=user).delete()
+    expires_at = timezone.now() + timedelta(minutes=minutes)
+    StockReservation.objects.bulk_create([
+        StockReservation(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in needed.items()
+    ])
+
+
+def held_until(user):
+    """When ``user``'s current hold runs out, or None if they hold nothing"""
+    return (
+        StockReservation.objects.filter(user=user, expires_at__gt=timezone.now())
+        .order_by('expires_at').values_list('expires_at', flat=True).first()
+    )
+
+
+@transaction.atomic
+def claim(user, lines):
+    """
+    Take stock for an order being placed, consuming ``user``'s hold.
+    Call inside the transaction that writes the order; raises
+    ``InsufficientStock`` if a line is short.
+    """
+    quantities = _quantities(lines)
+    _take(user, quantities)
+    StockReservation.objects.filter(user=user).delete()
+    _stock_changed(quantities)
+
+
+@transaction.atomic
+def restock(lines):
+    """Return ``(product_id, quantity)`` units to stock, e.g. for a cancelled order"""
+    quantities = _quantities(lines)
+    if quantities:
+        Product.objects.filter(id__in=list(quantities)).update(stock=F('stock') + _per_product(quantities))
+    _stock_changed(quantities)
+
+
+def release_expired(batch_size=500):
+    """Delete expired holds, one batch per statement; returns rows deleted"""
+    now = timezone.now()
+    released = 0
+    while True:
+        batch_ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch_ids:
+            return released
+        released += StockReservation.objects.filter(id__in=batch_ids).delete()[0]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from orders.rollups import BATCH_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily seller sales rollups from order history (run once after deploying)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Rollup rows written per statement',
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {written} daily sales rows')
+        )
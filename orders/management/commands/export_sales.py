@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import CustomUser
+from orders import exports
+
+
+class Command(BaseCommand):
+    help = "Write a seller's sales (one row per order item) to a CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to write')
+        parser.add_argument(
+            '--seller',
+            required=True,
+            help='Username of the seller whose sales are exported',
+        )
+        parser.add_argument('--start', help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=exports.CHUNK_SIZE,
+            help='Rows fetched from the database at a time',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            seller = CustomUser.objects.get(username=options['seller'], role='seller')
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Seller '{options['seller']}' does not exist")
+        try:
+            start, end = exports.parse_range(options['start'], options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        rows = 0
+        try:
+            with open(options['path'], 'w', newline='', encoding='utf-8') as stream:
+                for line in exports.csv_lines(
+                    exports.sales_rows(seller, start, end, chunk_size=options['chunk_size'])
+                ):
+                    stream.write(line)
+                    rows += 1
+        except OSError as e:
+            raise CommandError(f"Cannot write {options['path']}: {e}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported {rows - 1} sales rows to {options['path']}")
+        )
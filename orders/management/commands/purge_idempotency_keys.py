@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from orders.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than their TTL (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Keys deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys')
+        )
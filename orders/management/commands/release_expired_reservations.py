@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from orders.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout reservations (run from cron every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Reservations deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {released} expired stock reservations')
+        )
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def index_existing_orders(apps, schema_editor):
+    """One SellerOrder per (seller, order) already placed"""
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    SellerOrder = apps.get_model('orders', 'SellerOrder')
+    shares = (
+        OrderItem.objects.values('order_id', 'product__seller_id', 'order__status', 'order__order_date')
+        .annotate(
+            item_count=Sum('quantity'),
+            seller_subtotal=Sum(ExpressionWrapper(
+                F('quantity') * F('price'), output_field=DecimalField(max_digits=10, decimal_places=2)
+            )),
+        )
+        .order_by('order_id')
+    )
+    batch = []
+    for share in shares.iterator(chunk_size=1000):
+        batch.append(SellerOrder(
+            seller_id=share['product__seller_id'],
+            order_id=share['order_id'],
+            seller_subtotal=share['seller_subtotal'],
+            item_count=share['item_count'],
+            status=share['order__status'],
+            order_date=share['order__order_date'],
+        ))
+        if len(batch) >= 1000:
+            SellerOrder.objects.bulk_create(batch)
+            batch = []
+    SellerOrder.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SellerOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seller_subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('item_count', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('order_date', models.DateTimeField()),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_orders', to='orders.order')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seller_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['seller', '-order_date', '-id'], name='seller_order_recent')],
+                'constraints': [models.UniqueConstraint(fields=('seller', 'order'), name='unique_seller_order')],
+            },
+        ),
+        migrations.RunPython(index_existing_orders, migrations.RunPython.noop),
+    ]
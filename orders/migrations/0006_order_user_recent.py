@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_sellerorder'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-order_date', '-id'], name='order_user_recent'),
+        ),
+    ]
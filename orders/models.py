@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from store.models import Product
 from accounts.models import CustomUser as User
 
@@ -35,6 +35,8 @@ class Order(models.Model):
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
     ]
+    # Orders in these states no longer change
+    TERMINAL_STATUSES = ['delivered', 'cancelled']
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     customer_name = models.CharField(max_length=100)
@@ -50,14 +52,64 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-order_date']
+        indexes = [
+            # Serves the customer's newest-first order history pages
+            models.Index(fields=['user', '-order_date', '-id'], name='order_user_recent'),
+        ]
     
+    # Status as last read from or written to the database
+    _saved_status = None
+
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        order._saved_status = order.__dict__.get('status')
+        return order
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'status' in fields:
+            self._saved_status = self.__dict__.get('status')
+
+    def save(self, *args, changed_by=None, reason='', **kwargs):
+        """
+        A changed status is moved by ``transitions.transition`` rather than
+        written directly, so history, stock and rollups follow it. Raises
+        ValueError if the state machine does not allow the move.
+        """
+        from orders.transitions import transition
+
+        status, previous = self.status, self._saved_status
+        update_fields = kwargs.get('update_fields')
+        writes_status = update_fields is None or 'status' in update_fields
+        if previous is None or status == previous or not writes_status:
+            super().save(*args, **kwargs)
+            if writes_status:
+                self._saved_status = status
+            return
+        with transaction.atomic():
+            self.status = previous
+            try:
+                super().save(*args, **kwargs)
+                if not transition([self.pk], status, changed_by=changed_by, reason=reason):
+                    raise ValueError(f"Order #{self.pk} cannot move from {previous} to {status}")
+            finally:
+                self.status = status
+        self._saved_status = status
+
     @property
     def total_items(self):
+        # Order lists annotate item_quantity, saving a query per order
+        if hasattr(self, 'item_quantity'):
+            return self.item_quantity or 0
         return sum(item.quantity for item in self.items.all())
     
+    def is_terminal(self):
+        return self.status in self.TERMINAL_STATUSES
+
     def can_be_cancelled(self):
         """Check if order can be cancelled by customer or seller"""
         return self.status in ['pending', 'confirmed']
@@ -71,12 +123,15 @@ class Order(models.Model):
         return self.status in ['pending', 'confirmed']
     
     def cancel_order(self, cancelled_by=None, reason=None):
-        """Cancel the order with optional reason"""
-        if self.can_be_cancelled():
-            self.status = 'cancelled'
-            self.save()
-            return True
-        return False
+        """Cancel the order (``cancelled_by`` is the acting user) and return its units to stock"""
+        from orders.transitions import transition
+
+        if not self.can_be_cancelled():
+            return False
+        if not transition([self.id], 'cancelled', changed_by=cancelled_by, reason=reason):
+            return False
+        self.status = self._saved_status = 'cancelled'
+        return True
 
 
 class OrderItem(models.Model):
@@ -90,4 +145,95 @@ class OrderItem(models.Model):
 
     @property
     def total_price(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+class SellerOrder(models.Model):
+    """A seller's share of one order, kept in step with the order for the seller order list"""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seller_orders')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='seller_orders')
+    seller_subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    item_count = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'order'], name='unique_seller_order'),
+        ]
+        indexes = [
+            # Serves the seller's newest-first keyset pages
+            models.Index(fields=['seller', '-order_date', '-id'], name='seller_order_recent'),
+        ]
+
+    def __str__(self):
+        return f"Order #{self.order_id} for seller {self.seller_id}"
+
+    def can_be_cancelled_by_seller(self):
+        return self.status in ['pending', 'confirmed']
+
+
+class SellerDailySales(models.Model):
+    """A seller's sales on one day, kept up to date at checkout and on cancellation"""
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    # Units, revenue and orders count orders that were not cancelled
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'day'], name='unique_seller_day'),
+        ]
+
+    def __str__(self):
+        return f"Sales of seller {self.seller_id} on {self.day}"
+
+
+class OrderStatusHistory(models.Model):
+    """Append-only record of every status change an order went through"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_history')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+
+class StockReservation(models.Model):
+    """Units held for a customer's checkout; they count against Product.stock until they expire"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for {self.user_id} until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """Response of a POST sent with an idempotency key, replayed for retries of it"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=100)
+    request_path = models.CharField(max_length=255)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.response_status})"
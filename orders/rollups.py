@@ -0,0 +1,116 @@
+"""
+Daily sales rollups for seller dashboards.
+
+``SellerDailySales`` holds one row per seller per day (the day the order was
+placed) with units, revenue (quantity x price), orders and cancellations.
+Checkout adds each seller's share of the order and a cancellation moves it
+from sales to cancellations, each as one upsert however many rows it touches,
+so dashboards read a few small rows instead of summing every item ever sold.
+``rebuild`` recomputes everything from the seller order index, for the first
+deployment or after a manual data fix (``build_sales_rollups`` command).
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import SellerDailySales, SellerOrder
+
+FIELDS = ['units', 'revenue', 'orders', 'cancellations']
+BATCH_SIZE = 1000
+
+
+def _apply(deltas):
+    """Add ``{(seller_id, day): (units, revenue, orders, cancellations)}`` to the rollup rows"""
+    if not deltas:
+        return
+    SellerDailySales.objects.bulk_create(
+        [SellerDailySales(seller_id=seller_id, day=day) for seller_id, day in deltas],
+        ignore_conflicts=True,
+    )
+    match = Q()
+    for seller_id, day in deltas:
+        match |= Q(seller_id=seller_id, day=day)
+
+    def per_row(index, output_field):
+        return Case(
+            *(When(seller_id=seller_id, day=day, then=Value(values[index]))
+              for (seller_id, day), values in deltas.items()),
+            output_field=output_field,
+        )
+
+    SellerDailySales.objects.filter(match).update(
+        units=F('units') + per_row(0, IntegerField()),
+        revenue=F('revenue') + per_row(1, DecimalField(max_digits=12, decimal_places=2)),
+        orders=F('orders') + per_row(2, IntegerField()),
+        cancellations=F('cancellations') + per_row(3, IntegerField()),
+    )
+
+
+def record_order(order, shares):
+    """Add a placed order's ``{seller_id: (subtotal, units)}`` shares"""
+    day = timezone.localdate(order.order_date)
+    _apply({
+        (seller_id, day): (units, subtotal, 1, 0)
+        for seller_id, (subtotal, units) in shares.items()
+    })
+
+
+def record_cancellations(order_ids):
+    """Move cancelled orders' shares from sales to cancellations"""
+    deltas = {}
+    for seller_id, order_date, subtotal, units in SellerOrder.objects.filter(
+        order_id__in=list(order_ids)
+    ).values_list('seller_id', 'order_date', 'seller_subtotal', 'item_count'):
+        key = (seller_id, timezone.localdate(order_date))
+        current = deltas.get(key, (0, Decimal('0.00'), 0, 0))
+        deltas[key] = (current[0] - units, current[1] - subtotal, current[2] - 1, current[3] + 1)
+    _apply(deltas)
+
+
+@transaction.atomic
+def rebuild(batch_size=BATCH_SIZE):
+    """Recompute every rollup row from ``SellerOrder``; returns rows written"""
+    SellerDailySales.objects.all().delete()
+    live = ~Q(status='cancelled')
+    days = (
+        SellerOrder.objects.annotate(day=TruncDate('order_date'))
+        .values('seller_id', 'day')
+        .annotate(
+            units=Sum('item_count', filter=live, default=0),
+            revenue=Sum('seller_subtotal', filter=live, default=Decimal('0.00')),
+            orders=Count('id', filter=live),
+            cancellations=Count('id', filter=Q(status='cancelled')),
+        )
+        .order_by('seller_id', 'day')
+    )
+    written = 0
+    batch = []
+    for row in days.iterator(chunk_size=batch_size):
+        batch.append(SellerDailySales(**row))
+        if len(batch) >= batch_size:
+            written += len(SellerDailySales.objects.bulk_create(batch))
+            batch = []
+    written += len(SellerDailySales.objects.bulk_create(batch))
+    return written
+
+
+def seller_sales(seller, days=30):
+    """
+    All-time totals and the rows of the last ``days`` days for ``seller``'s
+    dashboard: one aggregate over their rollup rows plus the recent rows.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = SellerDailySales.objects.filter(seller=seller)
+    sums = rows.aggregate(**{field: Sum(field) for field in FIELDS})
+    totals = {'units': 0, 'revenue': Decimal('0.00'), 'orders': 0, 'cancellations': 0}
+    totals.update({field: value for field, value in sums.items() if value is not None})
+    recent = list(rows.filter(day__gte=since).order_by('day'))
+    best = max((row.revenue for row in recent), default=0)
+    for row in recent:
+        row.share = int(row.revenue * 100 / best) if best > 0 else 0
+    return {'totals': totals, 'recent': recent}
@@ -0,0 +1,41 @@
+"""
+Per-seller order index.
+
+``SellerOrder`` holds one row per (seller, order) with the seller's share of
+the order, its status and its date, so a seller's order list is a keyset
+scan of one indexed table instead of grouping every item they ever sold.
+Rows are written with the order at checkout and follow its status: through
+the ``Order`` post_save receiver for saves, and ``sync_status`` for
+set-based status updates.
+"""
+
+from decimal import Decimal
+
+from .models import SellerOrder
+
+
+def record(order, items):
+    """
+    Write ``order``'s seller rows from its ``(seller_id, quantity, price)``
+    items. Returns ``{seller_id: (subtotal, units)}``.
+    """
+    shares = {}
+    for seller_id, quantity, price in items:
+        subtotal, count = shares.get(seller_id, (Decimal('0.00'), 0))
+        shares[seller_id] = (subtotal + quantity * price, count + quantity)
+    SellerOrder.objects.bulk_create([
+        SellerOrder(
+            seller_id=seller_id,
+            order=order,
+            seller_subtotal=subtotal,
+            item_count=count,
+            status=order.status,
+            order_date=order.order_date,
+        )
+        for seller_id, (subtotal, count) in shares.items()
+    ])
+    return shares
+
+
+def sync_status(order_ids, status):
+    SellerOrder.objects.filter(order_id__in=list(order_ids)).update(status=status)
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from orders.models import Order
+
+
+@receiver(post_save, sender=Order)
+def sync_seller_order_status(sender, instance, created, **kwargs):
+    """Keep the seller order index and customer stats in step with saves (e.g. admin)"""
+    from orders.customer_stats import invalidate
+    from orders.seller_index import sync_status
+    if not created:
+        sync_status([instance.id], instance.status)
+    invalidate(instance.user_id)
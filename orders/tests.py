@@ -1,3 +1,474 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from orders import checkout, exports, inventory, rollups, transitions
+from orders.models import Order, OrderStatusHistory, SellerDailySales, SellerOrder, StockReservation
+from store.models import Product
+from ecommerce.testing import (
+    ShopTestCase,
+    ShopTransactionTestCase,
+    make_customer,
+    make_customer_with_cart,
+    make_product,
+    make_seller,
+)
+
+class StockReservationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.product = make_product(seller, stock=5)
+        self.customer = make_customer_with_cart('customer', self.product, quantity=2)
+        self.client.force_login(self.customer)
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.stock
+
+    def begin_checkout(self):
+        return self.client.post(reverse('checkout'), {'begin_checkout': '1'})
+
+    def test_only_beginning_checkout_holds_units(self):
+        self.client.get(reverse('checkout'))
+        self.assertFalse(StockReservation.objects.exists())
+
+        self.assertRedirects(self.begin_checkout(), reverse('checkout'), fetch_redirect_response=False)
+        self.begin_checkout()  # beginning again replaces the hold
+        self.assertEqual(list(StockReservation.objects.values_list('product_id', 'quantity')), [(self.product.id, 2)])
+        self.assertEqual(self.stock(), 5)
+
+        rival = Client()
+        rival.force_login(make_customer_with_cart('rival', self.product, quantity=4))
+        self.assertRedirects(
+            rival.post(reverse('checkout'), {'begin_checkout': '1'}), reverse('cart-view'), fetch_redirect_response=False
+        )
+        self.assertEqual(StockReservation.objects.count(), 1)
+
+        self.client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertEqual(Order.objects.get().items.get().quantity, 2)
+
+    def test_hold_counts_against_other_orders_until_it_expires(self):
+        self.begin_checkout()
+        rival = make_customer_with_cart('rival', self.product, quantity=5)
+        with self.assertRaises(inventory.InsufficientStock):
+            checkout.place_order(rival, checkout.load_cart_lines(rival))
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        checkout.place_order(rival, checkout.load_cart_lines(rival))
+        self.assertEqual(self.stock(), 0)
+        self.assertEqual(inventory.release_expired(), 1)
+        self.assertEqual(self.stock(), 0)
+
+    def test_seller_stock_edit_survives_the_hold(self):
+        self.begin_checkout()
+        Product.objects.filter(id=self.product.id).update(stock=10)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        inventory.release_expired()
+        self.assertEqual(self.stock(), 10)
+
+    def test_short_stock_places_no_order(self):
+        self.product.stock = 1
+        self.product.save()
+        response = self.client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+        self.assertRedirects(response, reverse('cart-view'), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), 1)
+
+    def test_place_order_query_count_is_flat_in_cart_size(self):
+        def queries_to_place(username, product_count):
+            customer = make_customer(username)
+            cart = Cart.objects.create(user=customer)
+            for number in range(product_count):
+                product = make_product(self.product.seller, f'{username} {number}', price=3, stock=10)
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+            lines = checkout.load_cart_lines(customer)
+            with CaptureQueriesContext(connection) as queries:
+                order = checkout.place_order(customer, lines, shipping_address='Street 1')
+            self.assertEqual(order.total_amount, 6 * product_count)
+            self.assertEqual(order.items.count(), product_count)
+            return len(queries)
+
+        self.assertEqual(queries_to_place('small', 1), queries_to_place('large', 10))
+
+    def test_cart_checkout_route_places_full_order(self):
+        self.client.post(reverse('cart-checkout'), {'address': 'Street 1', 'phone': '123'})
+        order = Order.objects.get()
+        self.assertEqual(order.total_amount, 20)
+        self.assertEqual(order.items.get().price, 10)
+        self.assertEqual(order.payment.amount, 20)
+
+    def test_cancel_returns_stock_once(self):
+        self.client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+        order = Order.objects.get()
+        self.assertTrue(order.cancel_order(cancelled_by=self.customer))
+        self.assertFalse(Order.objects.get().cancel_order(cancelled_by=self.customer))
+        self.assertEqual(self.stock(), 5)
+
+
+class IdempotencyKeyTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.product = make_product(self.seller, stock=5)
+        self.customer = make_customer_with_cart('customer', self.product)
+        self.client.force_login(self.customer)
+
+    def test_double_submitted_checkout_places_one_order(self):
+        data = {'address': 'Street 1', 'phone': '123', 'idempotency_key': 'checkout-1'}
+        first = self.client.post(reverse('checkout'), data)
+        second = self.client.post(reverse('checkout'), data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(second.status_code, first.status_code)
+        self.assertEqual(second['Location'], first['Location'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_replayed_cancel_returns_first_result(self):
+        self.client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+        url = reverse('customer-cancel-order', args=[Order.objects.get().id])
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='cancel-1')
+        second = self.client.post(url, HTTP_IDEMPOTENCY_KEY='cancel-1')
+        self.assertEqual(first.json(), {'success': True, 'message': 'Order cancelled successfully'})
+        self.assertEqual(second.json(), first.json())
+
+    def test_keys_are_scoped_per_action_and_bound_to_one_request(self):
+        self.client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+        order = Order.objects.get()
+        self.client.force_login(self.seller)
+        self.client.post(reverse('confirm-order', args=[order.id]), HTTP_IDEMPOTENCY_KEY='k')
+        response = self.client.post(reverse('seller-cancel-order', args=[order.id]), HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('confirm-order', args=[order.id + 1]), HTTP_IDEMPOTENCY_KEY='k')
+        self.assertEqual(response.status_code, 422)
+
+
+class SellerOrderIndexTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        other_seller = make_seller('other')
+        self.product = make_product(self.seller)
+        self.other_product = make_product(other_seller, 'Gadget', price=7)
+
+    def place(self, username):
+        customer = make_customer_with_cart(username, self.product, quantity=2)
+        CartItem.objects.create(cart=customer.cart, product=self.other_product, quantity=1)
+        return checkout.place_order(customer, checkout.load_cart_lines(customer))
+
+    def test_checkout_writes_one_row_per_seller_that_follows_status(self):
+        order = self.place('customer')
+        share = SellerOrder.objects.get(seller=self.seller)
+        self.assertEqual((share.order_id, share.item_count, share.seller_subtotal), (order.id, 2, 20))
+        self.assertEqual(SellerOrder.objects.filter(order=order).count(), 2)
+
+        self.client.force_login(self.seller)
+        self.client.post(reverse('confirm-order', args=[order.id]))
+        self.assertEqual(SellerOrder.objects.get(seller=self.seller).status, 'confirmed')
+        order.cancel_order(cancelled_by=self.seller)
+        self.assertEqual(set(SellerOrder.objects.values_list('status', flat=True)), {'cancelled'})
+
+    def test_seller_order_list_is_paged_with_constant_queries(self):
+        orders = [self.place(f'customer{number}') for number in range(25)]
+        self.client.force_login(self.seller)
+        with self.assertNumQueries(3):  # session, user, one page of the index
+            first = self.client.get(reverse('seller-orders'))
+        self.assertEqual(
+            [row.order_id for row in first.context['seller_orders']],
+            [order.id for order in reversed(orders)][:20],
+        )
+        second = self.client.get(reverse('seller-orders'), {'cursor': first.context['next_cursor']})
+        self.assertEqual(len(second.context['seller_orders']), 5)
+        self.assertIsNone(second.context['next_cursor'])
+
+
+class OrderHistoryTests(ShopTestCase):
+    def test_order_list_pages_with_item_counts_in_one_query(self):
+        seller = make_seller()
+        product = make_product(seller)
+        customer = make_customer_with_cart('customer', product, quantity=3)
+        orders = []
+        for _ in range(22):
+            orders.append(checkout.place_order(customer, checkout.load_cart_lines(customer)))
+            CartItem.objects.create(cart=customer.cart, product=product, quantity=3)
+        self.client.force_login(customer)
+        with CaptureQueriesContext(connection) as queries:
+            first = self.client.get(reverse('order-list'))
+        page_queries = [query for query in queries if 'orders_order' in query['sql']]
+        self.assertEqual(len(page_queries), 1)
+        self.assertEqual([order.total_items for order in first.context['orders']], [3] * 20)
+        second = self.client.get(reverse('order-list'), {'cursor': first.context['next_cursor']})
+        self.assertEqual([order.id for order in second.context['orders']], [orders[1].id, orders[0].id])
+
+
+class OrderDetailTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        product = make_product(self.seller)
+        self.customer = make_customer_with_cart('customer', product, quantity=2)
+        self.order = checkout.place_order(self.customer, checkout.load_cart_lines(self.customer))
+
+    def item_queries(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Widget')
+        return [query for query in queries if 'orders_orderitem' in query['sql']]
+
+    def test_open_order_items_are_read_every_time(self):
+        url = reverse('order-detail', args=[self.order.id])
+        self.assertEqual(len(self.item_queries(self.customer, url)), 1)
+        self.assertEqual(len(self.item_queries(self.customer, url)), 1)
+
+    def test_final_order_items_are_served_from_cache(self):
+        self.order.cancel_order()
+        for user, url in [
+            (self.customer, reverse('order-detail', args=[self.order.id])),
+            (self.seller, reverse('seller-order-detail', args=[self.order.id])),
+        ]:
+            self.assertEqual(len(self.item_queries(user, url)), 1)
+            self.assertEqual(self.item_queries(user, url), [])
+
+
+class OrderTransitionTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.product = make_product(self.seller)
+        other_seller = make_seller('other')
+        self.other_product = make_product(other_seller, 'Gadget', price=7)
+
+    def place(self, username, product):
+        customer = make_customer_with_cart(username, product)
+        return checkout.place_order(customer, checkout.load_cart_lines(customer))
+
+    def bulk(self, order_ids, status):
+        payload = json.dumps({'order_ids': order_ids, 'status': status})
+        return self.client.post(reverse('seller-bulk-transition'), payload, content_type='application/json')
+
+    def test_bulk_confirm_moves_only_the_sellers_pending_orders(self):
+        mine = [self.place(f'customer{number}', self.product) for number in range(3)]
+        theirs = self.place('someone', self.other_product)
+        mine[0].cancel_order(cancelled_by=mine[0].user)
+        self.client.force_login(self.seller)
+
+        response = self.bulk([order.id for order in mine] + [theirs.id], 'confirmed')
+
+        self.assertEqual(response.json()['moved'], [mine[1].id, mine[2].id])
+        self.assertEqual(response.json()['skipped'], [mine[0].id, theirs.id])
+        self.assertEqual(
+            list(Order.objects.order_by('id').values_list('status', flat=True)),
+            ['cancelled', 'confirmed', 'confirmed', 'pending'],
+        )
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=mine[1]).values_list('from_status', 'to_status', 'changed_by')),
+            [('pending', 'confirmed', self.seller.id)],
+        )
+
+    def test_bulk_cost_does_not_grow_with_orders(self):
+        orders = [self.place(f'customer{number}', self.product) for number in range(12)]
+        self.client.force_login(self.seller)
+
+        def queries_to_cancel(batch):
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk([order.id for order in batch], 'cancelled')
+            return len(queries)
+
+        self.assertEqual(queries_to_cancel(orders[:1]), queries_to_cancel(orders[1:]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 100)
+
+    def test_only_allowed_transitions_apply(self):
+        order = self.place('customer', self.product)
+        self.assertEqual(transitions.transition([order.id], 'delivered'), [])
+        for status in ['confirmed', 'processing', 'shipped', 'delivered']:
+            self.assertEqual(transitions.transition([order.id], status), [order.id])
+        self.assertFalse(Order.objects.get(id=order.id).cancel_order())
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order).count(), 4)
+
+    def test_saved_status_changes_go_through_the_state_machine(self):
+        order = Order.objects.get(id=self.place('customer', self.product).id)
+        order.status = 'cancelled'
+        order.save(reason='Out of stock')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 100)
+        self.assertEqual(SellerDailySales.objects.get().cancellations, 1)
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=order).values_list('from_status', 'to_status', 'reason')),
+            [('pending', 'cancelled', 'Out of stock')],
+        )
+        order.status = 'delivered'
+        with self.assertRaises(ValueError):
+            order.save()
+        self.assertEqual(Order.objects.get(id=order.id).status, 'cancelled')
+
+    def test_admin_status_edits_go_through_the_state_machine(self):
+        order = self.place('customer', self.product)
+        admin = make_seller('admin')
+        admin.is_staff = admin.is_superuser = True
+        admin.save()
+        self.client.force_login(admin)
+        url = reverse('admin:orders_order_change', args=[order.id])
+
+        def post(status):
+            return self.client.post(url, {
+                'user': order.user_id,
+                'customer_name': order.customer_name,
+                'customer_email': 'customer@example.com',
+                'status': status,
+                'total_amount': order.total_amount,
+                'shipping_address': '1 Main St',
+                'phone_number': '555-0100',
+            })
+
+        self.assertEqual(post('delivered').status_code, 200)  # not allowed from pending
+        self.assertEqual(post('cancelled').status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 100)
+        self.assertEqual(
+            list(OrderStatusHistory.objects.filter(order=order).values_list('from_status', 'to_status', 'changed_by')),
+            [('pending', 'cancelled', admin.id)],
+        )
+        self.assertEqual(SellerOrder.objects.get(order=order).status, 'cancelled')
+
+
+class SalesExportTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        product = make_product(self.seller, 'Widget, large')
+        other_seller = make_seller('other')
+        other_product = make_product(other_seller, 'Gadget', price=7)
+        self.orders = []
+        for number, days_ago in enumerate([10, 3]):
+            customer = make_customer_with_cart(f'customer{number}', product, quantity=2)
+            CartItem.objects.create(cart=customer.cart, product=other_product, quantity=1)
+            self.orders.append(checkout.place_order(customer, checkout.load_cart_lines(customer)))
+            Order.objects.filter(id=self.orders[-1].id).update(order_date=timezone.now() - timedelta(days=days_ago))
+
+    def test_export_streams_only_the_sellers_items_in_range(self):
+        self.client.force_login(self.seller)
+        start = (timezone.now() - timedelta(days=5)).date().isoformat()
+        response = self.client.get(reverse('seller-sales-export'), {'start': start})
+        self.assertTrue(response.streaming)
+        self.assertIn(f'sales-seller-{start}.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(exports.HEADER))
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.orders[1].id},'))
+        self.assertTrue(lines[1].endswith(',"Widget, large",2,10.00,20.00'))
+
+        self.assertEqual(self.client.get(reverse('seller-sales-export'), {'end': 'yesterday'}).status_code, 400)
+
+    def test_export_command_writes_all_rows(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sales.csv')
+            call_command('export_sales', path, seller='seller', stdout=out)
+            with open(path, encoding='utf-8') as stream:
+                self.assertEqual(len(stream.read().splitlines()), 3)
+        self.assertIn('Exported 2 sales rows', out.getvalue())
+
+
+class SalesRollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.product = make_product(self.seller)
+
+    def place(self, username, quantity):
+        customer = make_customer_with_cart(username, self.product, quantity=quantity)
+        return checkout.place_order(customer, checkout.load_cart_lines(customer))
+
+    def rollup_rows(self):
+        return list(SellerDailySales.objects.values_list('day', 'units', 'revenue', 'orders', 'cancellations'))
+
+    def test_checkout_and_cancellation_keep_rollups_in_step_with_a_rebuild(self):
+        self.place('first', 2)
+        cancelled = self.place('second', 3)
+        self.place('third', 1)
+        cancelled.cancel_order(cancelled_by=cancelled.user)
+
+        today = timezone.localdate()
+        self.assertEqual(self.rollup_rows(), [(today, 3, 30, 2, 1)])
+        incremental = self.rollup_rows()
+        out = StringIO()
+        call_command('build_sales_rollups', stdout=out)
+        self.assertIn('Rebuilt 1 daily sales rows', out.getvalue())
+        self.assertEqual(self.rollup_rows(), incremental)
+
+    def test_seller_dashboard_reads_revenue_from_rollups(self):
+        self.place('first', 2)
+        self.client.force_login(self.seller)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('seller-dashboard'))
+        self.assertEqual(response.context['total_revenue'], 20)
+        self.assertEqual([day.units for day in response.context['recent_sales']], [2])
+        self.assertFalse(any('SUM("orders_orderitem"' in query['sql'] for query in queries))
+
+    def test_totals_cover_all_time_and_chart_rows_the_window(self):
+        today = timezone.localdate()
+        SellerDailySales.objects.bulk_create([
+            SellerDailySales(seller=self.seller, day=today - timedelta(days=400), units=5, revenue=50, orders=2),
+            SellerDailySales(seller=self.seller, day=today - timedelta(days=29), units=1, revenue=10, orders=1),
+            SellerDailySales(seller=self.seller, day=today, units=2, revenue=40, orders=1, cancellations=1),
+        ])
+        with self.assertNumQueries(2):
+            sales = rollups.seller_sales(self.seller, days=30)
+        self.assertEqual(sales['totals'], {'units': 8, 'revenue': 100, 'orders': 4, 'cancellations': 1})
+        self.assertEqual([(row.day, row.share) for row in sales['recent']], [(today - timedelta(days=29), 25), (today, 100)])
+
+
+class ConcurrentCheckoutTests(ShopTransactionTestCase):
+    """Many customers race to check out the last units of one product"""
+
+    CUSTOMERS = 16
+    STOCK = 5
+
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.product = make_product(seller, stock=self.STOCK)
+        self.clients = []
+        for number in range(self.CUSTOMERS):
+            client = Client()
+            client.force_login(make_customer_with_cart(f'customer{number}', self.product))
+            self.clients.append(client)
+
+    def test_parallel_checkouts_never_oversell(self):
+        barrier = threading.Barrier(self.CUSTOMERS)
+        errors = []
+
+        def checkout(client):
+            try:
+                barrier.wait()
+                client.post(reverse('checkout'), {'address': 'Street 1', 'phone': '123'})
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(client,)) for client in self.clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertEqual(Order.objects.count(), self.STOCK)
+        self.assertEqual(CartItem.objects.count(), self.CUSTOMERS - self.STOCK)
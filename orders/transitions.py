@@ -0,0 +1,78 @@
+"""
+Order status state machine.
+
+``TRANSITIONS`` lists the statuses each status may move to. ``transition``
+moves any number of orders in one transaction: the orders are picked by a
+single SELECT scoped to the caller (a customer's own orders, or orders with a
+seller's products), then moved by one ``UPDATE ... WHERE status IN (...)``
+that only matches orders still in a state the move is allowed from, so no
+order is loaded, modified and saved back. Every move is appended to
+``OrderStatusHistory``; cancelled orders return their units to stock and
+move to the cancellations of the daily sales rollups, and the seller order
+index follows the new status.
+"""
+
+from django.db import transaction
+
+from .models import Order, OrderItem, OrderStatusHistory
+
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'processing', 'shipped', 'cancelled'},
+    'processing': {'shipped'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+# Orders moved per bulk request
+MAX_BULK_ORDERS = 500
+
+
+def sources_for(status):
+    """Statuses an order may be in to move to ``status``"""
+    return sorted(source for source, targets in TRANSITIONS.items() if status in targets)
+
+
+@transaction.atomic
+def transition(order_ids, status, user=None, seller=None, changed_by=None, reason=''):
+    """
+    Move the given orders to ``status``. Only the ``user``'s orders, or orders
+    containing ``seller``'s products, are considered. Returns the ids that
+    moved; the rest were not found, out of scope or not in an allowed state.
+    """
+    from .customer_stats import invalidate
+    from .inventory import restock
+    from .rollups import record_cancellations
+    from .seller_index import sync_status
+
+    if status not in TRANSITIONS:
+        raise ValueError(f"Unknown order status: {status}")
+    orders = Order.objects.filter(id__in=list(order_ids), status__in=sources_for(status))
+    if user is not None:
+        orders = orders.filter(user=user)
+    if seller is not None:
+        orders = orders.filter(seller_orders__seller=seller)
+    # Locked until commit, so the UPDATE below moves exactly these rows
+    rows = list(orders.select_for_update().values_list('id', 'status', 'user_id'))
+    if not rows:
+        return []
+    current = {order_id: from_status for order_id, from_status, _ in rows}
+    Order.objects.filter(id__in=list(current), status__in=sources_for(status)).update(status=status)
+
+    moved = sorted(current)
+    OrderStatusHistory.objects.bulk_create([
+        OrderStatusHistory(
+            order_id=order_id,
+            from_status=current[order_id],
+            to_status=status,
+            changed_by=changed_by,
+            reason=reason or '',
+        )
+        for order_id in moved
+    ])
+    sync_status(moved, status)
+    invalidate(*{user_id for _, _, user_id in rows})
+    if status == 'cancelled':
+        restock(OrderItem.objects.filter(order_id__in=moved).values_list('product_id', 'quantity'))
+        record_cancellations(moved)
+    return moved
@@ -6,6 +6,8 @@ urlpatterns = [
     path('orders/', views.order_list, name='order-list'),
     path('orders/<int:order_id>/', views.order_detail, name='order-detail'),
     path('seller-orders/', views.seller_orders, name='seller-orders'),
+    path('seller-orders/export/', views.seller_sales_export, name='seller-sales-export'),
+    path('seller-orders/transition/', views.seller_bulk_transition, name='seller-bulk-transition'),
     path('seller-order-detail/<int:order_id>/', views.seller_order_detail, name='seller-order-detail'),
     path('confirm-order/<int:order_id>/', views.confirm_order, name='confirm-order'),
     path('customer-cancel-order/<int:order_id>/', views.customer_cancel_order, name='customer-cancel-order'),
@@ -1,76 +1,87 @@
+import json
+import uuid
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db.models import Sum
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
-from .models import Order, OrderItem
-from cart.models import CartItem
-from payments.models import Payment
+from .models import Order, OrderItem, SellerOrder
+from orders import exports, inventory, transitions
+from orders.idempotency import idempotent
+from orders.checkout import cart_total, load_cart_lines, place_order
+from cart.storage import merge_session_cart
+from store.pagination import keyset_page
 
 @login_required
+@idempotent
 def checkout(request):
     """Simple checkout process"""
-    # Get user's cart items
-    cart_items = CartItem.objects.filter(cart__user=request.user)
+    # Anything added while logged out joins the saved cart first
+    merge_session_cart(request, request.user)
+    # Cart items with their products, loaded once for display, totals and writes
+    cart_items = load_cart_lines(request.user)
     
     if not cart_items:
         messages.error(request, 'Your cart is empty.')
         return redirect('cart-view')
     
-    # calculate total for display
-    total_amount = sum(item.quantity * item.product.price for item in cart_items)
-    
-    if request.method == 'POST':
-        payment_method = request.POST.get('payment_method', 'cash')
-        # total_amount already calculated above
+    if request.method == 'POST' and 'begin_checkout' in request.POST:
+        # Hold the units while the customer fills in the form
+        try:
+            inventory.reserve(request.user, [(item.product_id, item.quantity) for item in cart_items])
+        except inventory.InsufficientStock as e:
+            messages.error(request, str(e))
+            return redirect('cart-view')
+        return redirect('checkout')
 
-        order = Order.objects.create(
-            user=request.user,
-            customer_name=f"{request.user.first_name} {request.user.last_name}".strip() or request.user.username,
-            customer_email=request.user.email,
-            shipping_address=request.POST.get('address', ''),
-            phone_number=request.POST.get('phone', ''),
-            total_amount=total_amount,
-            status='pending'
-        )
-        
-        
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                product=cart_item.product,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
+    if request.method == 'POST':
+        try:
+            order = place_order(
+                request.user,
+                cart_items,
+                shipping_address=request.POST.get('address', ''),
+                phone_number=request.POST.get('phone', ''),
+                payment_method=request.POST.get('payment_method', 'cash'),
             )
-        
-       
-        # create a Payment record. For Cash on Delivery we'll set status to pending
-        Payment.objects.create(
-            user=request.user,
-            order=order,
-            amount=total_amount,
-            payment_method=payment_method,
-            status='pending'
-        )
-
-        cart_items.delete()
+        except inventory.InsufficientStock as e:
+            messages.error(request, str(e))
+            return redirect('cart-view')
 
         messages.success(request, f'Order placed successfully! Order ID: {order.id}')
         return redirect('order-detail', order_id=order.id)
     
-    return render(request, 'orders/checkout.html', {'cart_items': cart_items, 'total_amount': total_amount})
+    return render(request, 'orders/checkout.html', {
+        'cart_items': cart_items,
+        'total_amount': cart_total(cart_items),
+        'held_until': inventory.held_until(request.user),
+        # Sent back with the form, so a double-submit places one order
+        'idempotency_key': uuid.uuid4().hex,
+    })
 
 @login_required
 def order_detail(request, order_id):
     """View order details"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    return render(request, 'orders/order_detail.html', {'order': order})
+    order = get_object_or_404(
+        Order.objects.select_related('payment', 'shipping_method'), id=order_id, user=request.user
+    )
+    return render(request, 'orders/order_detail.html', {
+        'order': order,
+        # Lazy: only read when the items block is not served from the cache
+        'order_items': order.items.select_related('product__seller'),
+    })
 
 @login_required
 def order_list(request):
-    """List user's orders"""
-    orders = Order.objects.filter(user=request.user).order_by('-order_date')
-    return render(request, 'orders/order_list.html', {'orders': orders})
+    """List user's orders, a page at a time"""
+    # Item counts come from the same query as the page
+    orders, next_cursor = keyset_page(
+        Order.objects.filter(user=request.user).annotate(item_quantity=Sum('items__quantity')),
+        'order_date',
+        request.GET.get('cursor'),
+    )
+    return render(request, 'orders/order_list.html', {'orders': orders, 'next_cursor': next_cursor})
 
 @login_required
 def seller_orders(request):
@@ -79,60 +90,89 @@ def seller_orders(request):
         messages.error(request, 'Access denied. Seller account required.')
         return redirect('store-home')
     
-    # Get all order items for this seller's products
-    order_items = OrderItem.objects.filter(
-        product__seller=request.user
-    ).select_related('order', 'product').order_by('-order__order_date')
-    
-    # Group by order for better display
-    orders_dict = {}
-    for item in order_items:
-        order = item.order
-        if order.id not in orders_dict:
-            orders_dict[order.id] = {
-                'order': order,
-                'items': [],
-                'seller_total': 0
-            }
-        orders_dict[order.id]['items'].append(item)
-        orders_dict[order.id]['seller_total'] += item.total_price
-    
-    orders_data = list(orders_dict.values())
-    
-    return render(request, 'orders/seller_orders.html', {'orders_data': orders_data})
+    # One indexed scan of the seller's rows in the order index, a page at a time
+    seller_orders, next_cursor = keyset_page(
+        SellerOrder.objects.filter(seller=request.user).select_related('order__user'),
+        'order_date',
+        request.GET.get('cursor'),
+    )
+    
+    return render(request, 'orders/seller_orders.html', {
+        'seller_orders': seller_orders,
+        'next_cursor': next_cursor,
+    })
+
+@login_required
+def seller_sales_export(request):
+    """Stream the seller's sales as CSV, optionally between ``start`` and ``end`` (YYYY-MM-DD)"""
+    if request.user.role != 'seller':
+        messages.error(request, 'Access denied. Seller account required.')
+        return redirect('store-home')
+    
+    try:
+        start, end = exports.parse_range(request.GET.get('start'), request.GET.get('end'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
+    response = StreamingHttpResponse(
+        exports.csv_lines(exports.sales_rows(request.user, start, end)),
+        content_type='text/csv',
+    )
+    period = '-'.join(str(date) for date in (start, end) if date) or 'all'
+    response['Content-Disposition'] = f'attachment; filename="sales-{request.user.username}-{period}.csv"'
+    return response
+
+def _seller_refusal(request, order_id, message):
+    """Why a seller's status change matched no order"""
+    if not SellerOrder.objects.filter(order_id=order_id, seller=request.user).exists():
+        return JsonResponse({'success': False, 'message': 'No products from your store in this order'})
+    return JsonResponse({'success': False, 'message': message})
 
 @login_required
 @require_POST
+@idempotent
 def confirm_order(request, order_id):
     """Seller confirms an order"""
     if request.user.role != 'seller':
         return JsonResponse({'success': False, 'message': 'Access denied'})
     
+    # One conditional UPDATE; the reason is only looked up if nothing moved
+    if transitions.transition([order_id], 'confirmed', seller=request.user, changed_by=request.user):
+        messages.success(request, f'Order #{order_id} has been confirmed successfully!')
+        return JsonResponse({'success': True, 'message': 'Order confirmed successfully'})
+    return _seller_refusal(request, order_id, 'Order is not in pending status')
+
+@login_required
+@require_POST
+@idempotent
+def seller_bulk_transition(request):
+    """
+    Move many of the seller's orders to one status in a single request.
+    Body (JSON): ``{"order_ids": [1, 2, ...], "status": "confirmed"}``.
+    """
+    if request.user.role != 'seller':
+        return JsonResponse({'success': False, 'message': 'Access denied'}, status=403)
+    
     try:
-        # Get the order and verify seller has products in it
-        order = get_object_or_404(Order, id=order_id)
-        
-        # Check if seller has products in this order
-        seller_items = OrderItem.objects.filter(
-            order=order,
-            product__seller=request.user
-        )
-        
-        if not seller_items.exists():
-            return JsonResponse({'success': False, 'message': 'No products from your store in this order'})
-        
-        # Update order status to confirmed if it's pending
-        if order.status == 'pending':
-            order.status = 'confirmed'
-            order.save()
-            
-            messages.success(request, f'Order #{order.id} has been confirmed successfully!')
-            return JsonResponse({'success': True, 'message': 'Order confirmed successfully'})
-        else:
-            return JsonResponse({'success': False, 'message': 'Order is not in pending status'})
-            
-    except Exception as e:
-        return JsonResponse({'success': False, 'message': str(e)})
+        payload = json.loads(request.body or b'{}')
+        order_ids = sorted({int(order_id) for order_id in payload['order_ids']})
+        status = payload['status']
+        if status not in transitions.TRANSITIONS:
+            raise ValueError(f"Unknown status: {status}")
+        if len(order_ids) > transitions.MAX_BULK_ORDERS:
+            raise ValueError(f"At most {transitions.MAX_BULK_ORDERS} orders per request")
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        return JsonResponse({'success': False, 'message': f'Invalid request: {e}'}, status=400)
+    
+    moved = transitions.transition(order_ids, status, seller=request.user, changed_by=request.user)
+    if moved:
+        messages.success(request, f'{len(moved)} order(s) marked as {status}.')
+    return JsonResponse({
+        'success': bool(moved),
+        'message': f'{len(moved)} of {len(order_ids)} orders updated',
+        'moved': moved,
+        'skipped': sorted(set(order_ids) - set(moved)),
+    })
 
 @login_required
 def seller_order_detail(request, order_id):
@@ -141,80 +181,59 @@ def seller_order_detail(request, order_id):
         messages.error(request, 'Access denied. Seller account required.')
         return redirect('store-home')
     
-    order = get_object_or_404(Order, id=order_id)
-    
-    # Get only items from this seller
-    seller_items = OrderItem.objects.filter(
-        order=order,
-        product__seller=request.user
-    ).select_related('product')
+    # The seller's index row checks access and carries their total
+    seller_order = SellerOrder.objects.select_related(
+        'order__user', 'order__payment', 'order__shipping_method'
+    ).filter(order_id=order_id, seller=request.user).first()
     
-    if not seller_items.exists():
+    if seller_order is None:
         messages.error(request, 'No products from your store in this order.')
         return redirect('seller-orders')
     
-    seller_total = sum(item.total_price for item in seller_items)
-    
     context = {
-        'order': order,
-        'seller_items': seller_items,
-        'seller_total': seller_total,
+        'order': seller_order.order,
+        # Lazy: only read when the items block is not served from the cache
+        'seller_items': OrderItem.objects.filter(
+            order_id=order_id,
+            product__seller=request.user
+        ).select_related('product'),
+        'seller_total': seller_order.seller_subtotal,
     }
     
     return render(request, 'orders/seller_order_detail.html', context)
 
 @login_required
 @require_POST
+@idempotent
 def customer_cancel_order(request, order_id):
     """Customer cancels their own order"""
-    try:
-        order = get_object_or_404(Order, id=order_id, user=request.user)
-        
-        if not order.can_be_cancelled_by_customer():
-            return JsonResponse({
-                'success': False, 
-                'message': 'This order cannot be cancelled. Orders can only be cancelled when pending or confirmed.'
-            })
-        
-        if order.cancel_order(cancelled_by='customer'):
-            messages.success(request, f'Order #{order.id} has been cancelled successfully.')
-            return JsonResponse({'success': True, 'message': 'Order cancelled successfully'})
-        else:
-            return JsonResponse({'success': False, 'message': 'Unable to cancel order'})
-            
-    except Exception as e:
-        return JsonResponse({'success': False, 'message': str(e)})
+    if transitions.transition(
+        [order_id], 'cancelled', user=request.user, changed_by=request.user, reason='Cancelled by customer'
+    ):
+        messages.success(request, f'Order #{order_id} has been cancelled successfully.')
+        return JsonResponse({'success': True, 'message': 'Order cancelled successfully'})
+    
+    if not Order.objects.filter(id=order_id, user=request.user).exists():
+        return JsonResponse({'success': False, 'message': 'Order not found'})
+    return JsonResponse({
+        'success': False, 
+        'message': 'This order cannot be cancelled. Orders can only be cancelled when pending or confirmed.'
+    })
 
 @login_required
 @require_POST
+@idempotent
 def seller_cancel_order(request, order_id):
     """Seller cancels an order containing their products"""
     if request.user.role != 'seller':
         return JsonResponse({'success': False, 'message': 'Access denied'})
     
-    try:
-        order = get_object_or_404(Order, id=order_id)
-        
-        # Check if seller has products in this order
-        seller_items = OrderItem.objects.filter(
-            order=order,
-            product__seller=request.user
-        )
-        
-        if not seller_items.exists():
-            return JsonResponse({'success': False, 'message': 'No products from your store in this order'})
-        
-        if not order.can_be_cancelled_by_seller():
-            return JsonResponse({
-                'success': False, 
-                'message': 'This order cannot be cancelled. Orders can only be cancelled when pending or confirmed.'
-            })
-        
-        if order.cancel_order(cancelled_by='seller'):
-            messages.success(request, f'Order #{order.id} has been cancelled successfully.')
-            return JsonResponse({'success': True, 'message': 'Order cancelled successfully'})
-        else:
-            return JsonResponse({'success': False, 'message': 'Unable to cancel order'})
-            
-    except Exception as e:
-        return JsonResponse({'success': False, 'message': str(e)})
+    if transitions.transition(
+        [order_id], 'cancelled', seller=request.user, changed_by=request.user, reason='Cancelled by seller'
+    ):
+        messages.success(request, f'Order #{order_id} has been cancelled successfully.')
+        return JsonResponse({'success': True, 'message': 'Order cancelled successfully'})
+    return _seller_refusal(
+        request, order_id,
+        'This order cannot be cancelled. Orders can only be cancelled when pending or confirmed.'
+    )
@@ -0,0 +1,176 @@
+"""
+In-memory search-as-you-type index over product and category names.
+
+Every word-start suffix of a name ("red running shoes", "running shoes",
+"shoes") is stored in one sorted list, so the keys matching a prefix form one
+contiguous range found with two binary searches. Results are ranked by
+popularity (units sold, from ``OrderItem``). To rank a large range without
+scanning it, the list is cut into blocks of 16, 256, 4096, ... keys and the
+top results of every block are precomputed; a query merges a handful of those
+block lists with the few keys at the range edges. The index lives in process
+memory and is swapped atomically when a background rebuild finishes, so
+lookups never touch the database.
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import Sum
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 8
+# Each level's blocks are this many times larger than the previous level's
+BLOCK_FANOUT = 16
+# Rebuild even without a change signal (picks up writes from other workers)
+MAX_INDEX_AGE = 300
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+class AutocompleteIndex:
+    """Immutable snapshot: sorted keys plus per-block top results"""
+
+    def __init__(self, entries):
+        # entries: (label, kind, url, weight)
+        self.entries = entries
+        # Rank 0 is the best entry: most sold, then alphabetical
+        order = sorted(range(len(entries)), key=lambda position: (-entries[position][3], entries[position][0]))
+        self.rank = [0] * len(entries)
+        for rank, position in enumerate(order):
+            self.rank[position] = rank
+
+        pairs = []
+        for position, (label, _, _, _) in enumerate(entries):
+            words = normalize(label).split()
+            for start in range(len(words)):
+                pairs.append((' '.join(words[start:]), position))
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+        self.built_at = time.monotonic()
+
+        # levels[i] = (block_size, [top positions of each block])
+        self.levels = []
+        size, tops = 1, [[position] for position in self.positions]
+        while len(tops) > 1:
+            size *= BLOCK_FANOUT
+            tops = [
+                self._top(position for block in tops[i:i + BLOCK_FANOUT] for position in block)
+                for i in range(0, len(tops), BLOCK_FANOUT)
+            ]
+            self.levels.append((size, tops))
+
+    def _top(self, positions, limit=MAX_RESULTS):
+        return heapq.nsmallest(limit, set(positions), key=self.rank.__getitem__)
+
+    def _collect(self, low, high, level, out):
+        """Add candidate positions for keys[low:high] using blocks up to ``level``"""
+        if low >= high:
+            return
+        if level < 0:
+            out.extend(self.positions[low:high])
+            return
+        size, tops = self.levels[level]
+        first = -(-low // size)
+        last = high // size
+        if first >= last:
+            self._collect(low, high, level - 1, out)
+            return
+        self._collect(low, first * size, level - 1, out)
+        for block in range(first, last):
+            out.extend(tops[block])
+        self._collect(last * size, high, level - 1, out)
+
+    def search(self, query, limit=MAX_RESULTS):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        low = bisect_left(self.keys, prefix)
+        high = bisect_left(self.keys, prefix + '\uffff', low)
+        candidates = []
+        self._collect(low, high, len(self.levels) - 1, candidates)
+        return [
+            {'label': label, 'type': kind, 'url': url}
+            for label, kind, url, _ in (self.entries[position] for position in self._top(candidates, limit))
+        ]
+
+
+def build_index():
+    """Load names and popularity from the database (a few aggregate queries)"""
+    from orders.models import OrderItem
+    from store.models import Category, Product
+
+    sold = dict(
+        OrderItem.objects.values('product_id').annotate(units=Sum('quantity')).values_list('product_id', 'units')
+    )
+    entries = []
+    category_weight = {}
+    # reverse() once and fill in slugs, rather than once per product
+    product_url = reverse('product-detail', args=['__slug__'])
+    products = Product.objects.filter(available=True).values_list('id', 'name', 'slug', 'category_id')
+    for product_id, name, slug, category_id in products.iterator(chunk_size=5000):
+        weight = sold.get(product_id) or 0
+        entries.append((name, 'product', product_url.replace('__slug__', slug), weight))
+        if category_id:
+            category_weight[category_id] = category_weight.get(category_id, 0) + weight
+
+    shop_url = reverse('store-shop')
+    for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+        entries.append((name, 'category', f"{shop_url}?category={slug}", category_weight.get(category_id, 0)))
+    return AutocompleteIndex(entries)
+
+
+_index = None
+_build_lock = threading.Lock()
+_rebuild_pending = threading.Event()
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autocomplete')
+
+
+def _rebuild():
+    global _index
+    try:
+        # Clear first: changes arriving during the build queue another pass
+        _rebuild_pending.clear()
+        with _build_lock:
+            _index = build_index()
+    except Exception as e:
+        logger.error(f"Error rebuilding autocomplete index: {e}")
+    finally:
+        connection.close()
+
+
+def schedule_rebuild():
+    """Rebuild in the background; bursts of changes collapse into one rebuild"""
+    if not _rebuild_pending.is_set():
+        _rebuild_pending.set()
+        _executor.submit(_rebuild)
+
+
+def get_index():
+    global _index
+    index = _index
+    if index is None:
+        # First request in this process builds synchronously
+        with _build_lock:
+            if _index is None:
+                _index = build_index()
+            index = _index
+    elif time.monotonic() - index.built_at > MAX_INDEX_AGE:
+        schedule_rebuild()
+    return index
+
+
+def suggest(query, limit=MAX_RESULTS):
+    return get_index().search(query, limit)
@@ -0,0 +1,370 @@
+"""
+Streaming bulk import and export of a seller's product catalogue.
+
+Imports read CSV or JSON Lines one row at a time, validate each row, resolve
+categories from an in-memory map and insert valid rows with ``bulk_create``
+in fixed-size chunks, each chunk in its own transaction. Exports stream rows
+straight from a server-side iterator. Neither direction holds the whole file
+or catalogue in memory.
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from django.db.models import F
+from django.utils.text import slugify
+from store.categories import category_registry
+from store.models import Category, Product
+from store.signals import products_bulk_changed
+
+UPDATE_FIELDS = ['slug', 'price', 'stock', 'stock_delta', 'available']
+EXPORT_FIELDS = ['name', 'slug', 'category', 'description', 'price', 'stock', 'available']
+DEFAULT_CHUNK_SIZE = 1000
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+
+class RowError(ValueError):
+    """A single import row failed validation"""
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield ``(row_number, dict)`` from a binary CSV or JSONL stream. A file
+    that is not UTF-8 ends with a ``RowError`` for the row reading stopped at.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    row_number = 0
+    try:
+        for row_number, row in _parse_rows(text, fmt):
+            yield row_number, row
+    except UnicodeDecodeError:
+        yield row_number + 1, RowError("File is not UTF-8 encoded; no further rows were read")
+
+
+def _parse_rows(text, fmt):
+    if fmt == 'jsonl':
+        for row_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, RowError(f"Invalid JSON: {e.msg}")
+                continue
+            yield row_number, row if isinstance(row, dict) else RowError("Each line must be a JSON object")
+    else:
+        # Row 1 is the header, so data rows are numbered from 2
+        for row_number, row in enumerate(csv.DictReader(text), start=2):
+            yield row_number, row
+
+
+def detect_format(filename):
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+class CategoryMap:
+    """Category lookups by slug or name, seeded from the category registry"""
+
+    def __init__(self):
+        self.by_key = {}
+        for category_id, name, slug in category_registry.all():
+            self.by_key[slug.lower()] = category_id
+            self.by_key[name.lower()] = category_id
+
+    def resolve(self, value):
+        value = (value or '').strip()
+        if not value:
+            return None
+        category_id = self.by_key.get(value.lower())
+        if category_id is None:
+            slug = slugify(value)
+            if not slug:
+                raise RowError(f"Invalid category: {value!r}")
+            # Same behaviour as add_product's "new category" field
+            category, created = Category.objects.get_or_create(slug=slug, defaults={'name': value})
+            category_id = category.id
+            self.by_key[value.lower()] = self.by_key[category.slug] = category_id
+        return category_id
+
+
+def _parse_bool(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"Invalid boolean for 'available': {value!r}")
+
+
+def _parse_price(value):
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f"Invalid price: {value!r}")
+    # Must fit Product.price (max_digits=10, decimal_places=2)
+    if not price.is_finite() or price < 0 or price.as_tuple().exponent < -2 or price >= Decimal('1e8'):
+        raise RowError(f"Invalid price: {value!r}")
+    return price
+
+
+def _parse_int(value, field):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f"Invalid {field}: {value!r}")
+
+
+def build_product(row, seller, categories):
+    """Validate one row and return an unsaved Product"""
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise RowError("'name' is required")
+    max_length = Product._meta.get_field('slug').max_length
+    slug = str(row.get('slug') or '').strip()
+    if slug:
+        # The slug ends up in product URLs, so anything url() cannot reverse is rejected
+        try:
+            validate_slug(slug)
+        except ValidationError:
+            raise RowError(f"Invalid slug: {slug!r}")
+        if len(slug) > max_length:
+            raise RowError(f"'slug' is longer than {max_length} characters")
+    else:
+        slug = slugify(name)[:max_length].strip('-')
+        if not slug:
+            raise RowError("'slug' is required")
+
+    price = _parse_price(row.get('price', ''))
+    stock = _parse_int(row.get('stock') or 0, 'stock')
+    if stock < 0:
+        raise RowError("'stock' cannot be negative")
+
+    return Product(
+        seller=seller,
+        category_id=categories.resolve(row.get('category')),
+        name=name[:200],
+        slug=slug,
+        description=str(row.get('description') or ''),
+        price=price,
+        stock=stock,
+        available=_parse_bool(row.get('available')),
+    )
+
+
+def _flush(chunk, result):
+    """Insert one chunk of (row_number, product) pairs atomically"""
+    slugs = [product.slug for _, product in chunk]
+    taken = set(Product.objects.filter(slug__in=slugs).values_list('slug', flat=True))
+    seen = set()
+    to_create = []
+    for row_number, product in chunk:
+        if product.slug in taken or product.slug in seen:
+            result['errors'].append((row_number, f"Slug '{product.slug}' already exists"))
+            continue
+        seen.add(product.slug)
+        to_create.append(product)
+    if to_create:
+        with transaction.atomic():
+            created = Product.objects.bulk_create(to_create)
+            product_ids = [product.id for product in created if product.id]
+            transaction.on_commit(
+                lambda: products_bulk_changed.send(sender=Product, product_ids=product_ids)
+            )
+        result['created'] += len(to_create)
+
+
+def import_products(stream, seller, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import products for ``seller`` from a binary stream.
+
+    Returns ``{'created': int, 'errors': [(row_number, message), ...]}``.
+    """
+    categories = CategoryMap()
+    result = {'created': 0, 'errors': []}
+    chunk = []
+    for row_number, row in iter_rows(stream, fmt):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            chunk.append((row_number, build_product(row, seller, categories)))
+        except RowError as e:
+            result['errors'].append((row_number, str(e)))
+        if len(chunk) >= chunk_size:
+            _flush(chunk, result)
+            chunk = []
+    if chunk:
+        _flush(chunk, result)
+    # Slug conflicts are only detected at flush time, so restore file order
+    result['errors'].sort()
+    return result
+
+
+def _parse_change(row):
+    """Validate one update row into ``(slug, {field: value}, stock_delta)``"""
+    slug = str(row.get('slug') or '').strip()
+    if not slug:
+        raise RowError("'slug' is required")
+
+    values = {}
+    if row.get('price') not in (None, ''):
+        values['price'] = _parse_price(row['price'])
+    if row.get('stock') not in (None, ''):
+        values['stock'] = _parse_int(row['stock'], 'stock')
+        if values['stock'] < 0:
+            raise RowError("'stock' cannot be negative")
+    if row.get('available') not in (None, ''):
+        values['available'] = _parse_bool(row['available'])
+
+    stock_delta = 0
+    if row.get('stock_delta') not in (None, ''):
+        if 'stock' in values:
+            raise RowError("Give either 'stock' or 'stock_delta', not both")
+        stock_delta = _parse_int(row['stock_delta'], 'stock_delta')
+
+    if not values and not stock_delta:
+        raise RowError("Nothing to update")
+    return slug, values, stock_delta
+
+
+@transaction.atomic
+def _apply_changes(batch, seller, result):
+    """
+    Apply one batch of (row_number, slug, values, delta) in a transaction.
+    Returns the ids of the products that changed.
+    """
+    products = {
+        product.slug: product
+        for product in Product.objects.filter(
+            seller=seller, slug__in=[slug for _, slug, _, _ in batch]
+        ).only('id', 'slug', 'price', 'stock', 'available')
+    }
+    products_by_id = {product.id: product for product in products.values()}
+
+    changed = {}
+    product_deltas = {}
+    for row_number, slug, values, stock_delta in batch:
+        product = products.get(slug)
+        if product is None:
+            result['errors'].append((row_number, f"No product with slug '{slug}'"))
+            continue
+        for field, value in values.items():
+            setattr(product, field, value)
+        if values:
+            # Only the columns some row set for this product are written back
+            changed.setdefault(product.id, set()).update(values)
+        if stock_delta:
+            # Several rows may adjust the same product; net them out first
+            total, rows = product_deltas.get(product.id, (0, []))
+            product_deltas[product.id] = (total + stock_delta, rows + [row_number])
+
+    deltas = {}
+    for product_id, (total, row_numbers) in product_deltas.items():
+        if total:
+            deltas.setdefault(total, []).append((row_numbers, products_by_id[product_id]))
+
+    updated_ids = set(changed)
+    changed_fields = set().union(*changed.values())
+    # One bulk_update per distinct set of changed columns, so a price-only
+    # row never writes back a stale stock over a concurrent checkout
+    groups = {}
+    for product_id, fields in changed.items():
+        groups.setdefault(tuple(sorted(fields)), []).append(products_by_id[product_id])
+    for fields, group in groups.items():
+        Product.objects.bulk_update(group, fields)
+    # Relative stock changes run as UPDATE ... SET stock = stock + n,
+    # one statement per distinct delta, and never take stock below zero
+    for delta, entries in deltas.items():
+        ids = [product.id for _, product in entries]
+        rows = Product.objects.select_for_update().filter(id__in=ids)
+        if delta < 0:
+            rows = rows.filter(stock__gte=-delta)
+        applied = set(rows.values_list('id', flat=True))
+        Product.objects.filter(id__in=applied).update(stock=F('stock') + delta)
+        updated_ids |= applied
+        if applied:
+            changed_fields.add('stock')
+        for row_numbers, product in entries:
+            if product.id not in applied:
+                for row_number in row_numbers:
+                    result['errors'].append((row_number, f"Not enough stock for '{product.slug}'"))
+    product_ids = sorted(updated_ids)
+    # Receivers skip what these columns cannot affect (e.g. autocomplete for a price change)
+    fields = sorted(changed_fields)
+    if product_ids:
+        transaction.on_commit(
+            lambda: products_bulk_changed.send(sender=Product, product_ids=product_ids, fields=fields)
+        )
+    return updated_ids
+
+
+def update_products(rows, seller, batch_size=DEFAULT_CHUNK_SIZE):
+    """
+    Apply price/stock/availability changes to ``seller``'s products.
+
+    ``rows`` yields ``(row_number, dict)`` pairs (see ``iter_rows``) whose
+    dicts have a ``slug`` plus any of ``price``, ``stock``, ``stock_delta``
+    and ``available``. Returns ``{'updated': int, 'errors': [...]}``.
+    """
+    result = {'updated': 0, 'errors': []}
+    # A product changed by several batches is still one updated product
+    updated_ids = set()
+    batch = []
+    for row_number, row in rows:
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError("Each change must be an object")
+            batch.append((row_number, *_parse_change(row)))
+        except RowError as e:
+            result['errors'].append((row_number, str(e)))
+        if len(batch) >= batch_size:
+            updated_ids |= _apply_changes(batch, seller, result)
+            batch = []
+    if batch:
+        updated_ids |= _apply_changes(batch, seller, result)
+    result['updated'] = len(updated_ids)
+    result['errors'].sort()
+    return result
+
+
+class _Echo:
+    """File-like object whose write() just returns the value (for csv.writer)"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(seller, chunk_size=2000):
+    """Yield one tuple per product of ``seller`` in EXPORT_FIELDS order"""
+    return (
+        Product.objects.filter(seller=seller)
+        .order_by('id')
+        .values_list('name', 'slug', 'category__slug', 'description', 'price', 'stock', 'available')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def stream_csv(seller):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(seller):
+        yield writer.writerow(row)
+
+
+def stream_jsonl(seller):
+    for row in export_rows(seller):
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['price'] = str(record['price'])
+        yield json.dumps(record) + '\n'
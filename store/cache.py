@@ -0,0 +1,94 @@
+"""
+Version-tagged caching for storefront fragments.
+
+Each cached fragment's key includes the current version of the tags its
+content depends on: ``product:<id>`` for one product's card and details,
+``reviews:<product_id>`` for its review block, ``product-list`` for which
+products any listing holds and ``categories`` for the category menu. A
+listing's fragment is keyed by ``listing_version``, which also follows the
+tags of the products it shows, so a stock change refreshes only the listings
+that show that product. Nothing is ever deleted on
+a change; the affected tags are bumped instead, so keys built from the old
+versions are never read again and age out of the cache. Tag versions live in
+the cache itself, so with a shared backend every worker sees a bump.
+"""
+
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+PRODUCT_LIST_TAG = 'product-list'
+CATEGORIES_TAG = 'categories'
+
+
+def product_tag(product_id):
+    return f"product:{product_id}"
+
+
+def reviews_tag(product_id):
+    return f"reviews:{product_id}"
+
+
+def _version_key(tag):
+    return f"tag-version:{tag}"
+
+
+def _fresh_version():
+    # Seeded from the clock, so a tag that was evicted and recreated never
+    # reuses a version some stale fragment was stored under
+    return time.time_ns()
+
+
+def tag_versions(*tags):
+    """Current version of each tag, as ``{tag: version}`` (one cache round trip)"""
+    keys = {_version_key(tag): tag for tag in tags}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, tag in keys.items():
+        version = found.get(key)
+        if version is None:
+            # add() keeps whichever worker's version got there first
+            cache.add(key, _fresh_version(), None)
+            version = cache.get(key)
+        versions[tag] = version
+    return versions
+
+
+def tag_version(tag):
+    return tag_versions(tag)[tag]
+
+
+def listing_version(name, products, *vary_on):
+    """
+    Version of a cached product listing: moves when the ``product-list`` tag
+    or the tag of any product on it moves. The listed ids are kept under the
+    ``product-list`` version, so a warm listing costs two cache reads and no
+    query.
+    """
+    list_version = tag_version(PRODUCT_LIST_TAG)
+    vary = hashlib.md5(repr(vary_on).encode()).hexdigest()
+    key = f"listing:{name}:{vary}:{list_version}"
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = list(products.values_list('id', flat=True))
+        cache.set(key, product_ids, FRAGMENT_TIMEOUT)
+    tags = [product_tag(product_id) for product_id in product_ids]
+    versions = tag_versions(*tags)
+    parts = [str(list_version)] + [str(versions[tag]) for tag in tags]
+    return hashlib.md5(','.join(parts).encode()).hexdigest()
+
+
+def bump_tags(*tags):
+    # A new clock value rather than incr(): two concurrent bumps can never
+    # land on the same version, and a missing key needs no special case
+    version = _fresh_version()
+    cache.set_many({_version_key(tag): version for tag in tags}, None)
+
+
+def bump_tags_on_commit(*tags):
+    """Bump once the current transaction commits, so readers never cache old rows under a new version"""
+    transaction.on_commit(lambda: bump_tags(*tags))
+
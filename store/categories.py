@@ -0,0 +1,71 @@
+"""
+Process-level category registry.
+
+Categories are read on every shop and product-form request but almost never
+change, so each process keeps them in memory. The snapshot is tied to the
+``categories`` cache tag, which the Category save/delete signals bump (see
+``store.cache``); a change made in any worker is picked up by every other one
+on its next lookup, at the cost of one cache read instead of a query.
+"""
+
+import threading
+from collections import namedtuple
+
+from store.cache import CATEGORIES_TAG, tag_version
+
+CategoryEntry = namedtuple('CategoryEntry', ['id', 'name', 'slug'])
+
+_Snapshot = namedtuple('_Snapshot', ['version', 'entries', 'by_id', 'by_slug'])
+
+
+class CategoryRegistry:
+    """In-memory id/name/slug lookups, reloaded when the categories tag moves"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def _current(self):
+        version = tag_version(CATEGORIES_TAG)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                from store.models import Category
+                # The version is read before the query, so a change committed
+                # while loading leaves the tag ahead and forces another reload
+                entries = tuple(
+                    CategoryEntry(*row)
+                    for row in Category.objects.order_by('id').values_list('id', 'name', 'slug')
+                )
+                snapshot = _Snapshot(
+                    version=version,
+                    entries=entries,
+                    by_id={entry.id: entry for entry in entries},
+                    by_slug={entry.slug: entry for entry in entries},
+                )
+                self._snapshot = snapshot
+        return snapshot
+
+    def all(self):
+        return self._current().entries
+
+    def get(self, category_id):
+        """Entry for an id (int or form string), or None"""
+        try:
+            return self._current().by_id.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def id_for_slug(self, slug):
+        entry = self._current().by_slug.get(slug)
+        return entry.id if entry else None
+
+    def name(self, category_id):
+        entry = self.get(category_id)
+        return entry.name if entry else None
+
+
+category_registry = CategoryRegistry()
@@ -0,0 +1,110 @@
+"""
+Product image pipeline.
+
+Uploads are stored untouched and a background job then derives resized JPEG
+and WebP variants at fixed widths with all metadata (EXIF, GPS, ICC) stripped.
+The variant paths and the original dimensions are recorded on the product so
+listing pages can render ``srcset`` markup from the product row alone.
+
+Variants are saved through the content-addressed default storage and may be
+shared with other products, so superseded variants are left for the
+``gc_media_blobs`` command rather than deleted here.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+from store.signals import products_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1024)
+VARIANT_FORMATS = {
+    'jpeg': {'format': 'JPEG', 'ext': 'jpg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+    'webp': {'format': 'WEBP', 'ext': 'webp', 'options': {'quality': 80, 'method': 4}},
+}
+VARIANTS_DIR = 'products/variants'
+
+# Small pool so image work never competes with request threads for long
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='product-images')
+
+
+def queue_image_processing(product_id):
+    """Schedule variant generation once the current transaction commits"""
+    transaction.on_commit(lambda: _executor.submit(_run_in_background, product_id))
+
+
+def _run_in_background(product_id):
+    try:
+        process_product_image(product_id)
+    except Exception as e:
+        logger.error(f"Error processing image for product {product_id}: {e}")
+    finally:
+        # Worker threads get their own connection; don't leak it
+        connection.close()
+
+
+def _open_clean(field_file):
+    """Open an upload, apply EXIF orientation and drop all embedded metadata"""
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        image.load()
+    finally:
+        field_file.close()
+    image.info = {}
+    return image
+
+
+def _encode(image, fmt):
+    spec = VARIANT_FORMATS[fmt]
+    if spec['format'] == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, spec['format'], **spec['options'])
+    return buffer.getvalue()
+
+
+def process_product_image(product_id):
+    """Generate all variants for a product's current image (runs synchronously)"""
+    from store.models import Product
+
+    product = Product.objects.filter(id=product_id).only('id', 'image').first()
+    if product is None or not product.image:
+        return None
+
+    source_name = product.image.name
+    image = _open_clean(product.image)
+    original_width, original_height = image.size
+    stem = PurePosixPath(source_name).stem
+
+    variants = {fmt: {} for fmt in VARIANT_FORMATS}
+    # Never upscale: widths above the original collapse onto the original width
+    widths = sorted({min(width, original_width) for width in VARIANT_WIDTHS})
+    for width in widths:
+        height = max(1, round(original_height * width / original_width))
+        resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+        for fmt, spec in VARIANT_FORMATS.items():
+            name = f"{VARIANTS_DIR}/{stem}-{width}w.{spec['ext']}"
+            variants[fmt][str(width)] = default_storage.save(name, ContentFile(_encode(resized, fmt)))
+
+    # Only record the result if the image wasn't replaced while we were working
+    updated = Product.objects.filter(id=product_id, image=source_name).update(
+        image_width=original_width,
+        image_height=original_height,
+        image_variants=variants,
+    )
+    if not updated:
+        return None
+    # A queryset update sends no post_save; cached cards need the new srcset
+    products_bulk_changed.send(sender=Product, product_ids=[product_id])
+    return variants
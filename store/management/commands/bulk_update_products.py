@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import CustomUser
+from store import bulk
+
+
+class Command(BaseCommand):
+    help = 'Bulk update price, stock and availability of a seller\'s products from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File with columns slug, price, stock, stock_delta, available')
+        parser.add_argument(
+            '--seller',
+            required=True,
+            help='Username of the seller who owns the products',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default=None,
+            help='File format (detected from the extension by default)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=bulk.DEFAULT_CHUNK_SIZE,
+            help='Changes applied per transaction',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            seller = CustomUser.objects.get(username=options['seller'], role='seller')
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Seller '{options['seller']}' does not exist")
+
+        fmt = options['format'] or bulk.detect_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = bulk.update_products(
+                    bulk.iter_rows(stream, fmt), seller, batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        for row_number, message in result['errors']:
+            self.stdout.write(self.style.ERROR(f"Row {row_number}: {message}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\nBulk update complete!\n'
+                f'Updated: {result["updated"]} products\n'
+                f'Rejected: {len(result["errors"])} rows'
+            )
+        )
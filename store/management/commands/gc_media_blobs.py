@@ -0,0 +1,90 @@
+import os
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import models
+from store.models import Product
+from store.storage import BLOB_ROOT, blob_digest
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs that no database row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted',
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=60,
+            help='Keep unreferenced blobs younger than this (uploads still in flight)',
+        )
+
+    def file_fields(self):
+        for model in apps.get_models():
+            for field in model._meta.get_fields():
+                if isinstance(field, models.FileField):
+                    yield model, field
+
+    def referenced_names(self):
+        """Every stored file name held by a FileField/ImageField or image variant"""
+        names = set()
+        for model, field in self.file_fields():
+            values = (
+                model._default_manager.exclude(**{field.name: ''})
+                .exclude(**{f'{field.name}__isnull': True})
+                .values_list(field.name, flat=True)
+            )
+            names.update(values.iterator(chunk_size=2000))
+        for variants in Product.objects.exclude(image_variants={}).values_list('image_variants', flat=True).iterator(chunk_size=2000):
+            for sizes in variants.values():
+                names.update(sizes.values())
+        return names
+
+    def is_referenced(self, name):
+        """Check one blob against the database again, right before deleting it"""
+        for model, field in self.file_fields():
+            if model._default_manager.filter(**{field.name: name}).exists():
+                return True
+        # Blob names are unique hashes, so a match in the variants JSON is a reference
+        return Product.objects.filter(image_variants__icontains=name).exists()
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['grace_minutes'] * 60
+
+        referenced = {name for name in self.referenced_names() if blob_digest(name)}
+        root = default_storage.path(BLOB_ROOT)
+
+        deleted_count = 0
+        reclaimed_bytes = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                name = os.path.relpath(full_path, default_storage.location).replace(os.sep, '/')
+                if name in referenced:
+                    continue
+                stat = os.stat(full_path)
+                # Leftover .tmp files and unreferenced blobs are both garbage once old enough
+                if stat.st_mtime > cutoff:
+                    continue
+                # A row may have started pointing at it since the scan began
+                if self.is_referenced(name):
+                    continue
+                deleted_count += 1
+                reclaimed_bytes += stat.st_size
+                if not dry_run:
+                    default_storage.delete(name)
+
+        action = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} {deleted_count} unreferenced blobs '
+                f'({reclaimed_bytes / 1024 / 1024:.1f} MB), {len(referenced)} still referenced'
+            )
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from store.images import process_product_image
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG/WebP variants for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild variants for products that already have them',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            products = products.filter(image_variants={})
+
+        processed_count = 0
+        errors_count = 0
+        for product_id in products.values_list('id', flat=True).iterator():
+            try:
+                process_product_image(product_id)
+                processed_count += 1
+            except Exception as e:
+                errors_count += 1
+                self.stdout.write(self.style.ERROR(f"Error processing product {product_id}: {e}"))
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Image processing complete!\n'
+                f'Processed: {processed_count} products\n'
+                f'Errors: {errors_count} products'
+            )
+        )
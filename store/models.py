@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.db.models import Avg
 
 class Category(models.Model):
@@ -18,6 +19,10 @@ class Product(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # Filled in by the background image pipeline (store.images)
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
@@ -30,6 +35,31 @@ class Product(models.Model):
         avg = self.reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
         return round(avg, 1) if avg else 0.0
 
+    def _srcset(self, fmt):
+        sizes = self.image_variants.get(fmt, {}) if self.image_variants else {}
+        return ", ".join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in sorted(sizes.items(), key=lambda item: int(item[0]))
+        )
+
+    @property
+    def jpeg_srcset(self):
+        """srcset of the resized JPEG variants (empty until processed)"""
+        return self._srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        """srcset of the resized WebP variants (empty until processed)"""
+        return self._srcset('webp')
+
+    @property
+    def thumbnail_url(self):
+        """Smallest JPEG variant, falling back to the original upload"""
+        sizes = self.image_variants.get('jpeg') if self.image_variants else None
+        if sizes:
+            return default_storage.url(sizes[min(sizes, key=int)])
+        return self.image.url if self.image else ''
+
     def __str__(self):
         return self.name
 
@@ -44,6 +74,13 @@ class Review(models.Model):
     reply = models.TextField(blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Seller review listing: newest first per product, keyset on (created, id)
+            models.Index(fields=['product', '-created', '-id'], name='review_product_created_idx'),
+            models.Index(fields=['product', 'rating'], name='review_product_rating_idx'),
+        ]
+
     def __str__(self):
         return f"{self.customer.username} - {self.product.name}"
 
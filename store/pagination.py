@@ -0,0 +1,58 @@
+"""
+Keyset (seek) pagination helpers.
+
+Pages are ordered newest first on a datetime column with the primary key as a
+tie-breaker, and the position is carried between requests as an opaque cursor
+instead of an OFFSET, so every page costs the same single indexed query no
+matter how deep the user scrolls.
+"""
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+DEFAULT_PAGE_SIZE = 20
+
+
+def encode_cursor(value, pk):
+    """Encode a (datetime, pk) position as a URL-safe token"""
+    return urlsafe_base64_encode(f"{value.isoformat()}|{pk}".encode())
+
+
+def decode_cursor(token):
+    """Decode a cursor token, returning None for missing or malformed input"""
+    if not token:
+        return None
+    try:
+        raw_value, raw_pk = force_str(urlsafe_base64_decode(token)).rsplit('|', 1)
+        value = parse_datetime(raw_value)
+        pk = int(raw_pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+def keyset_page(queryset, field, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return ``(items, next_cursor)`` for one page of ``queryset`` ordered by
+    ``-field, -pk``. ``next_cursor`` is None on the last page.
+    """
+    queryset = queryset.order_by(f'-{field}', '-pk')
+    position = decode_cursor(cursor)
+    if position:
+        value, pk = position
+        queryset = queryset.filter(
+            Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+        )
+
+    # Fetch one extra row to find out whether another page exists
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
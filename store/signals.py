@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from store.cache import (
+    CATEGORIES_TAG, PRODUCT_LIST_TAG, bump_tags_on_commit, product_tag, reviews_tag,
+)
+
+# Sent after a bulk write (bulk_create/bulk_update/queryset update) to
+# products, which bypasses the per-instance post_save/post_delete signals.
+# Receivers get ``product_ids``: the ids of every product that changed, and
+# optionally ``fields``: the only columns written (absent means "any").
+products_bulk_changed = Signal()
+
+# Columns the autocomplete index is built from
+AUTOCOMPLETE_FIELDS = {'name', 'available', 'category'}
+# Columns that decide which listings a product appears on
+LISTING_FIELDS = {'name', 'available', 'category'}
+
+
+@receiver(post_save, sender='store.Product')
+@receiver(post_delete, sender='store.Product')
+@receiver(post_save, sender='store.Category')
+@receiver(post_delete, sender='store.Category')
+@receiver(products_bulk_changed)
+def rebuild_autocomplete_signal(sender, fields=None, **kwargs):
+    """Refresh the autocomplete index once the change is committed"""
+    from store.autocomplete import schedule_rebuild
+    if fields is not None and not AUTOCOMPLETE_FIELDS.intersection(fields):
+        return  # e.g. stock moving at checkout
+    transaction.on_commit(schedule_rebuild)
+
+
+@receiver(post_save, sender='store.Product')
+@receiver(post_delete, sender='store.Product')
+def invalidate_product_fragments_signal(sender, instance, **kwargs):
+    """The product's own card and page, plus every listing it can appear in"""
+    bump_tags_on_commit(product_tag(instance.id), PRODUCT_LIST_TAG)
+
+
+@receiver(products_bulk_changed)
+def invalidate_bulk_product_fragments_signal(sender, product_ids, fields=None, **kwargs):
+    """
+    The products' own tags, which the listings showing them follow; the list
+    tag only when a product may have entered or left a listing, so a checkout
+    taking stock leaves every other listing cached
+    """
+    tags = [product_tag(product_id) for product_id in product_ids]
+    if fields is None or LISTING_FIELDS.intersection(fields):
+        tags.append(PRODUCT_LIST_TAG)
+    bump_tags_on_commit(*tags)
+
+
+@receiver(post_save, sender='store.Category')
+@receiver(post_delete, sender='store.Category')
+def invalidate_category_fragments_signal(sender, instance, **kwargs):
+    # Listings filter by category slug, so they go stale too
+    bump_tags_on_commit(CATEGORIES_TAG, PRODUCT_LIST_TAG)
+
+
+@receiver(post_save, sender='store.Review')
+@receiver(post_delete, sender='store.Review')
+def invalidate_review_fragments_signal(sender, instance, **kwargs):
+    bump_tags_on_commit(reviews_tag(instance.product_id))
+
+
+@receiver(post_save, sender='ml_analytics.ReviewSentiment')
+def invalidate_review_sentiment_fragments_signal(sender, instance, **kwargs):
+    """Sentiment is filled in after the review is saved; show it once it lands"""
+    bump_tags_on_commit(reviews_tag(instance.review.product_id))
@@ -0,0 +1,15 @@
+from django import template
+from store import cache
+
+register = template.Library()
+
+
+@register.filter
+def tag_version(tag, object_id=None):
+    """
+    Current version of a cache tag, for use as a ``{% cache %}`` vary-on
+    argument: ``"product-list"|tag_version`` or ``"product"|tag_version:product.id``.
+    """
+    if object_id not in (None, ''):
+        tag = f"{tag}:{object_id}"
+    return cache.tag_version(tag)
@@ -1,3 +1,494 @@
-from django.test import TestCase
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from ecommerce.testing import ShopTestCase, make_customer, make_customer_with_cart, make_product, make_seller
+from orders import checkout
+from store import autocomplete, bulk, cache as fragment_cache
+from store.categories import CategoryRegistry
+from store.images import VARIANT_FORMATS, process_product_image
+from store.management.commands.gc_media_blobs import Command as GcMediaBlobs
+from store.models import Category, Product, Review
+from store.pagination import decode_cursor, encode_cursor
+from store.signals import products_bulk_changed
+from store.storage import blob_digest
+
+
+class SellerReviewListTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        lamp = make_product(self.seller, 'Lamp')
+        desk = make_product(self.seller, 'Desk')
+        other = make_product(make_seller('other'), 'Chair')
+        customer = make_customer()
+        Review.objects.bulk_create(
+            [Review(product=lamp if number % 2 else desk, customer=customer, rating=number % 5 + 1, comment='ok')
+             for number in range(45)]
+            + [Review(product=other, customer=customer, rating=5, comment='ok')]
+        )
+        # Pairs of reviews share a timestamp, so pages must break ties on the id
+        now = timezone.now()
+        for review_id in Review.objects.values_list('id', flat=True):
+            Review.objects.filter(id=review_id).update(created=now - timedelta(minutes=review_id // 2))
+        self.client.force_login(self.seller)
+
+    def walk(self, **filters):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('all-seller-reviews'), {**filters, **({'cursor': cursor} if cursor else {})})
+            seen += [review.id for review in response.context['reviews']]
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                return seen
+
+    def test_cursor_pages_cover_every_review_once_newest_first(self):
+        expected = list(
+            Review.objects.filter(product__seller=self.seller).order_by('-created', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.walk(), expected)
+        self.assertEqual(
+            self.walk(rating='3'),
+            list(Review.objects.filter(id__in=expected, rating=3).order_by('-created', '-id').values_list('id', flat=True)),
+        )
+
+    def test_page_is_one_query_with_its_related_rows(self):
+        response = self.client.get(reverse('all-seller-reviews'))
+        cursor = response.context['next_cursor']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('all-seller-reviews'), {'cursor': cursor})
+            for review in response.context['reviews']:
+                review.product.name, review.customer.username
+        self.assertEqual(len([query for query in queries if 'store_review' in query['sql']]), 1)
+
+    def test_cursor_round_trips_and_rejects_garbage(self):
+        created = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created, 42)), (created, 42))
+        for token in ['', 'not-base64!', encode_cursor(created, 42)[:-3]]:
+            self.assertIsNone(decode_cursor(token))
+        response = self.client.get(reverse('all-seller-reviews'), {'cursor': 'garbage'})
+        self.assertEqual(len(response.context['reviews']), 20)
+
+
+class MediaTestCase(ShopTestCase):
+    """Points the default storage at a throwaway media root"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def save(self, name, data):
+        return default_storage.save(name, ContentFile(data))
+
+    def age(self, name, minutes):
+        then = time.time() - minutes * 60
+        os.utime(default_storage.path(name), (then, then))
+
+    def blob_files(self):
+        names = []
+        for dirpath, _, filenames in os.walk(default_storage.path('blobs')):
+            names += [os.path.join(dirpath, filename) for filename in filenames]
+        return names
+
+
+class ContentAddressedStorageTests(MediaTestCase):
+    def test_identical_uploads_share_one_blob(self):
+        first = self.save('products/a.JPG', b'same bytes')
+        second = self.save('products/b.jpg', b'same bytes')
+        other = self.save('products/c.jpg', b'other bytes')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertIsNotNone(blob_digest(first))
+        self.assertEqual(len(self.blob_files()), 2)
+
+    def test_reused_blob_is_fresh_again(self):
+        name = self.save('products/a.jpg', b'same bytes')
+        self.age(name, 120)
+        self.save('products/b.jpg', b'same bytes')
+        self.assertGreater(os.path.getmtime(default_storage.path(name)), time.time() - 60)
+
+
+class ImageVariantTests(MediaTestCase):
+    def photo(self, size, orientation=None):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', size, 'orange').save(buffer, 'JPEG', exif=exif)
+        return self.save('products/photo.jpg', buffer.getvalue())
+
+    def test_variants_are_resized_stripped_and_recorded(self):
+        product = make_product(make_seller(), image=self.photo((800, 400)))
+        variants = process_product_image(product.id)
+
+        self.assertEqual(set(variants), set(VARIANT_FORMATS))
+        # 1024 would upscale, so it collapses onto the original width
+        self.assertEqual(sorted(variants['jpeg'], key=int), ['320', '640', '800'])
+        for fmt, sizes in variants.items():
+            for width, name in sizes.items():
+                with default_storage.open(name) as stored, Image.open(stored) as image:
+                    self.assertEqual(image.format, VARIANT_FORMATS[fmt]['format'])
+                    self.assertEqual(image.width, int(width))
+                    self.assertEqual(len(image.getexif()), 0)
+
+        product.refresh_from_db()
+        self.assertEqual((product.image_width, product.image_height), (800, 400))
+        self.assertEqual(product.image_variants, variants)
+        self.assertEqual(product.thumbnail_url, default_storage.url(variants['jpeg']['320']))
+        self.assertIn(' 640w', product.webp_srcset)
+
+    def test_exif_orientation_is_applied(self):
+        product = make_product(make_seller(), image=self.photo((800, 400), orientation=6))
+        variants = process_product_image(product.id)
+        product.refresh_from_db()
+        self.assertEqual((product.image_width, product.image_height), (400, 800))
+        self.assertEqual(sorted(variants['webp'], key=int), ['320', '400'])
+
+    def test_products_without_images_are_skipped(self):
+        product = make_product(make_seller())
+        self.assertIsNone(process_product_image(product.id))
+        self.assertEqual(product.thumbnail_url, '')
+        out = StringIO()
+        call_command('process_product_images', stdout=out)
+        self.assertIn('Processed: 0 products', out.getvalue())
+
+
+class GcMediaBlobsTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        seller = make_seller()
+        self.image = self.save('products/a.jpg', b'image')
+        self.variant = self.save('products/variants/a-320w.jpg', b'variant')
+        self.orphan = self.save('products/old.jpg', b'orphan')
+        self.recent = self.save('products/new.jpg', b'recent upload')
+        make_product(seller, image=self.image, image_variants={'jpeg': {'320': self.variant}})
+        for name in [self.image, self.variant, self.orphan]:
+            self.age(name, 120)
+
+    def gc(self, **options):
+        out = StringIO()
+        call_command('gc_media_blobs', stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertIn('Would delete 1 unreferenced blobs', self.gc(dry_run=True))
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_referenced_and_recent_blobs_are_kept(self):
+        self.assertIn('Deleted 1 unreferenced blobs', self.gc())
+        self.assertFalse(default_storage.exists(self.orphan))
+        for name in [self.image, self.variant, self.recent]:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_reference_made_during_the_scan_keeps_the_blob(self):
+        # The scan missed the orphan's new owner; the check before unlinking must not
+        make_product(make_seller('other'), 'Gadget', image=self.orphan)
+        with mock.patch.object(GcMediaBlobs, 'referenced_names', return_value=set()):
+            self.assertIn('Deleted 0 unreferenced blobs', self.gc())
+        self.assertTrue(default_storage.exists(self.orphan))
+
+
+class BulkImportTests(ShopTestCase):
+    CSV = (
+        'name,slug,category,description,price,stock,available\n'
+        'Desk lamp,,Lighting,Warm light,19.99,4,yes\n'
+        'Floor lamp,floor-lamp,lighting,,35,2,\n'
+        'No price,,Lighting,,,1,\n'
+        'Odd category,,!!!,,5,1,\n'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.client.force_login(self.seller)
+
+    def upload(self, content, name='products.csv'):
+        upload = SimpleUploadedFile(name, content if isinstance(content, bytes) else content.encode())
+        return self.client.post(reverse('import-products'), {'file': upload}).context['result']
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        result = self.upload(self.CSV)
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['errors'], [(4, "Invalid price: ''"), (5, "Invalid category: '!!!'")])
+        self.assertEqual(
+            list(Product.objects.order_by('slug').values_list('slug', 'category__slug', 'stock')),
+            [('desk-lamp', 'lighting', 4), ('floor-lamp', 'lighting', 2)],
+        )
+        self.assertFalse(Category.objects.filter(slug='').exists())
+
+    def test_slugs_that_cannot_be_urls_are_rejected(self):
+        long_name = 'Lamp ' * 30
+        result = self.upload(
+            'name,slug,price\n'
+            'Slash,a/b,5\n'
+            'Space,has space,5\n'
+            f'Long slug,{"x" * 80},5\n'
+            f'{long_name},,5\n'
+        )
+        self.assertEqual(result['errors'], [
+            (2, "Invalid slug: 'a/b'"),
+            (3, "Invalid slug: 'has space'"),
+            (4, "'slug' is longer than 50 characters"),
+        ])
+        product = Product.objects.get()
+        self.assertLessEqual(len(product.slug), 50)
+        self.assertTrue(product.slug.startswith('lamp-lamp'))
+        self.assertEqual(self.client.get(reverse('store-home')).status_code, 200)
+
+    def test_reupload_creates_nothing_new(self):
+        self.upload(self.CSV)
+        result = self.upload(self.CSV)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([row for row, _ in result['errors']], [2, 3, 4, 5])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_jsonl_rows_are_checked_one_by_one(self):
+        content = '{"name": "Desk", "price": "20"}\n[1]\n{bad\n'
+        result = self.upload(content, name='products.jsonl')
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([row for row, _ in result['errors']], [2, 3])
+
+    def test_non_utf8_file_is_a_file_error(self):
+        result = self.upload('name,price\nCaf\xe9,3\n'.encode('latin-1'))
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['errors'], [(1, 'File is not UTF-8 encoded; no further rows were read')])
+
+    def test_export_streams_what_was_imported(self):
+        self.upload(self.CSV)
+        response = self.client.get(reverse('export-products'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ','.join(bulk.EXPORT_FIELDS))
+        self.assertEqual(lines[1], 'Desk lamp,desk-lamp,lighting,Warm light,19.99,4,True')
+
+
+class BulkUpdateTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.seller = make_seller()
+        self.lamp = make_product(self.seller, 'Lamp', stock=5)
+        self.desk = make_product(self.seller, 'Desk', stock=5)
+        make_product(make_seller('other'), 'Chair')
+
+    def update(self, changes, **options):
+        return bulk.update_products(enumerate(changes, start=1), self.seller, **options)
+
+    def test_rows_write_only_the_columns_they_change(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.update([{'slug': 'lamp', 'price': '12.50'}, {'slug': 'desk', 'stock': '9'}])
+        self.assertEqual(result, {'updated': 2, 'errors': []})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        # The lamp's stock is not written back, so a checkout racing the update keeps its decrement
+        self.assertEqual(['"stock"' in sql for sql in updates if '"price"' in sql], [False])
+        self.lamp.refresh_from_db()
+        self.assertEqual((self.lamp.price, self.lamp.stock), (Decimal('12.50'), 5))
+
+    def test_price_and_stock_changes_leave_listings_and_autocomplete_alone(self):
+        list_version = fragment_cache.tag_version(fragment_cache.PRODUCT_LIST_TAG)
+        lamp_version = fragment_cache.tag_version(fragment_cache.product_tag(self.lamp.id))
+        with mock.patch('store.autocomplete.schedule_rebuild') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.update([{'slug': 'lamp', 'price': '3'}, {'slug': 'desk', 'stock_delta': '1'}])
+            self.assertFalse(rebuild.called)
+            self.assertEqual(fragment_cache.tag_version(fragment_cache.PRODUCT_LIST_TAG), list_version)
+            self.assertNotEqual(fragment_cache.tag_version(fragment_cache.product_tag(self.lamp.id)), lamp_version)
+
+            # Hiding a product takes it off listings and out of the suggestions
+            with self.captureOnCommitCallbacks(execute=True):
+                self.update([{'slug': 'desk', 'available': 'no'}])
+            self.assertTrue(rebuild.called)
+            self.assertNotEqual(fragment_cache.tag_version(fragment_cache.PRODUCT_LIST_TAG), list_version)
+
+    def test_products_are_counted_once_across_batches(self):
+        result = self.update(
+            [{'slug': 'lamp', 'stock_delta': '-2'}, {'slug': 'lamp', 'stock_delta': '-2'}, {'slug': 'lamp', 'price': '3'}],
+            batch_size=1,
+        )
+        self.assertEqual(result, {'updated': 1, 'errors': []})
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 1)
+
+    def test_bad_rows_are_rejected_individually(self):
+        self.client.force_login(self.seller)
+        payload = {'changes': [
+            {'slug': 'lamp', 'stock_delta': '-9'},
+            {'slug': 'chair', 'price': '1'},
+            {'slug': 'desk', 'stock': '2', 'stock_delta': '1'},
+            {'slug': 'desk', 'stock': '7'},
+        ]}
+        response = self.client.post(reverse('bulk-update-products'), json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.json()['updated'], 1)
+        self.assertEqual(
+            response.json()['errors'],
+            [
+                {'row': 1, 'message': "Not enough stock for 'lamp'"},
+                {'row': 2, 'message': "No product with slug 'chair'"},
+                {'row': 3, 'message': "Give either 'stock' or 'stock_delta', not both"},
+            ],
+        )
+        self.assertEqual(dict(self.seller.product_set.values_list('slug', 'stock')), {'lamp': 5, 'desk': 7})
+
+
+class AutocompleteTests(ShopTestCase):
+    def test_block_ranking_matches_a_full_scan(self):
+        words = ['red', 'blue', 'running', 'shoes', 'shirt', 'shorts', 'lamp', 'desk']
+        chooser = random.Random(7)
+        entries = [
+            (' '.join(chooser.sample(words, 3)) + f' {number}', 'product', f'/p/{number}/', chooser.randrange(50))
+            for number in range(600)
+        ]
+        index = autocomplete.AutocompleteIndex(entries)
+        self.assertGreater(len(index.levels), 2)
+        for query in ['s', 'sh', 'shoes', 'Running  SH', 'red blue', 'lamp 1', 'zebra']:
+            prefix = autocomplete.normalize(query)
+            matches = [
+                entry for entry in entries
+                if any(' '.join(entry[0].split()[start:]).startswith(prefix) for start in range(4))
+            ]
+            matches.sort(key=lambda entry: (-entry[3], entry[0]))
+            self.assertEqual([result['label'] for result in index.search(query)], [entry[0] for entry in matches[:8]])
+
+    def test_suggestions_come_from_the_catalogue_ranked_by_units_sold(self):
+        seller = make_seller()
+        running = Category.objects.create(name='Running gear', slug='running-gear')
+        plain = make_product(seller, 'Red running shoes', category=running)
+        popular = make_product(seller, 'Trail running shoes', category=running)
+        make_product(seller, 'Running shoes (old model)', available=False)
+        customer = make_customer_with_cart('customer', popular, quantity=3)
+        checkout.place_order(customer, checkout.load_cart_lines(customer))
+
+        with mock.patch.object(autocomplete, '_index', None):
+            response = self.client.get(reverse('store-autocomplete'), {'q': 'runn'})
+            with self.assertNumQueries(0):
+                self.client.get(reverse('store-autocomplete'), {'q': 'shoes'})
+        self.assertEqual(
+            [(result['type'], result['label']) for result in response.json()['results']],
+            # The category weighs what its products sold; ties go alphabetically
+            [('category', 'Running gear'), ('product', 'Trail running shoes'), ('product', 'Red running shoes')],
+        )
+        self.assertEqual(response.json()['results'][2]['url'], reverse('product-detail', args=[plain.slug]))
+
+
+class FragmentCacheTests(ShopTestCase):
+    CARD = Template(
+        '{% load cache store_cache %}'
+        '{% cache 500 card product.id "product"|tag_version:product.id %}{{ product.name }}{% endcache %}'
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.product = make_product(make_seller(), 'Lamp')
+
+    def card(self):
+        return self.CARD.render(Context({'product': Product.objects.get(id=self.product.id)}))
+
+    def rename(self, name):
+        # A queryset update sends no post_save, like every bulk write
+        Product.objects.filter(id=self.product.id).update(name=name)
+
+    def test_tag_versions_are_stable_until_bumped(self):
+        tag = fragment_cache.product_tag(self.product.id)
+        version = fragment_cache.tag_version(tag)
+        self.assertEqual(fragment_cache.tag_versions(tag, 'other'), {tag: version, 'other': fragment_cache.tag_version('other')})
+        with self.captureOnCommitCallbacks() as callbacks:
+            fragment_cache.bump_tags_on_commit(tag)
+        self.assertEqual(fragment_cache.tag_version(tag), version)
+        callbacks[0]()
+        self.assertNotEqual(fragment_cache.tag_version(tag), version)
+
+    def test_tag_bump_invalidates_the_fragment(self):
+        self.assertEqual(self.card(), 'Lamp')
+        self.rename('Desk lamp')
+        self.assertEqual(self.card(), 'Lamp')
+        fragment_cache.bump_tags(fragment_cache.product_tag(self.product.id))
+        self.assertEqual(self.card(), 'Desk lamp')
+
+    def test_bulk_change_signal_invalidates_cards_and_listings(self):
+        self.client.get(reverse('store-shop'))
+        self.card()
+        self.rename('Desk lamp')
+        self.assertNotContains(self.client.get(reverse('store-shop')), 'Desk lamp')
+        with self.captureOnCommitCallbacks(execute=True):
+            products_bulk_changed.send(sender=Product, product_ids=[self.product.id], fields=['name'])
+        self.assertEqual(self.card(), 'Desk lamp')
+        self.assertContains(self.client.get(reverse('store-shop')), 'Desk lamp')
+
+    def test_checkout_refreshes_only_listings_showing_the_product(self):
+        Product.objects.filter(id=self.product.id).update(stock=5)
+        other = make_product(self.product.seller, 'Desk', category=Category.objects.create(name='Desks', slug='desks'))
+        desks_url = reverse('store-shop') + '?category=desks'
+        self.assertContains(self.client.get(reverse('store-shop')), '5 available')
+        self.client.get(desks_url)
+        list_version = fragment_cache.tag_version(fragment_cache.PRODUCT_LIST_TAG)
+
+        customer = make_customer_with_cart('customer', self.product, quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout.place_order(customer, checkout.load_cart_lines(customer))
+
+        self.assertEqual(fragment_cache.tag_version(fragment_cache.PRODUCT_LIST_TAG), list_version)
+        self.assertContains(self.client.get(reverse('store-shop')), '3 available')
+        # Served whole from the cache: no product query for a listing the lamp is not on
+        with CaptureQueriesContext(connection) as queries:
+            self.assertContains(self.client.get(desks_url), other.name)
+        self.assertFalse(any('store_product' in query['sql'] for query in queries))
+
+    def test_saving_a_product_refreshes_its_page(self):
+        url = reverse('product-detail', args=[self.product.slug])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.description = 'Now with a dimmer'
+            self.product.save()
+        self.assertContains(self.client.get(url), 'Now with a dimmer')
+
+
+class CategoryRegistryTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lighting = Category.objects.create(name='Lighting', slug='lighting')
+        self.registry = CategoryRegistry()
+
+    def test_lookups_are_served_from_memory(self):
+        self.assertEqual([entry.slug for entry in self.registry.all()], ['lighting'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.registry.get(str(self.lighting.id)).name, 'Lighting')
+            self.assertEqual(self.registry.id_for_slug('lighting'), self.lighting.id)
+            self.assertEqual(self.registry.name(self.lighting.id), 'Lighting')
+            self.assertIsNone(self.registry.get('new'))
+            self.assertIsNone(self.registry.id_for_slug('missing'))
+
+    def test_category_changes_reload_the_snapshot(self):
+        self.registry.all()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Tools', slug='tools')
+        with self.assertNumQueries(1):
+            self.assertEqual([entry.slug for entry in self.registry.all()], ['lighting', 'tools'])
+
+        # Writes that skip the signals are only seen once the tag moves
+        Category.objects.filter(slug='tools').update(name='Hand tools')
+        self.assertEqual(self.registry.name(self.registry.id_for_slug('tools')), 'Tools')
+        fragment_cache.bump_tags(fragment_cache.CATEGORIES_TAG)
+        self.assertEqual(self.registry.name(self.registry.id_for_slug('tools')), 'Hand tools')
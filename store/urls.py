@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.home, name='store-home'),
     path('shop/', views.shop, name='store-shop'),
+    path('search/autocomplete/', views.autocomplete, name='store-autocomplete'),
     path('product/<slug>/', views.product_detail, name='product-detail'),
 
     path('add/', views.add_product, name='add-product'),
@@ -12,5 +13,8 @@ urlpatterns = [
     path('seller/reviews/<int:product_id>/', views.seller_reviews, name='seller-reviews'),
     path('seller/products/update/<int:product_id>/', views.update_product, name='update-product'),
     path('seller/products/delete/<int:product_id>/', views.delete_product, name='delete-product'),
+    path('seller/products/import/', views.import_products, name='import-products'),
+    path('seller/products/export/', views.export_products, name='export-products'),
+    path('seller/products/bulk-update/', views.bulk_update_products, name='bulk-update-products'),
 ]
 
@@ -1,42 +1,77 @@
+import json
+import mimetypes
+import os
+
 from django.shortcuts import render, redirect, get_object_or_404
 from store.models import Product, Category, Review
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
-from django.db.models import Count
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import quote_etag
+from store.storage import media_etag, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+from store import bulk
+from store.autocomplete import suggest
+from store.cache import listing_version
+from store.categories import category_registry
+from store.images import queue_image_processing
+from store.pagination import keyset_page
+from ml_analytics.recommendations import product_recommendations
 
 def home(request):
     products = Product.objects.filter(available=True)[:6]
-    return render(request, 'store/home.html', {'products': products})
+    return render(request, 'store/home.html', {
+        'products': products,
+        'listing_version': listing_version('home', products),
+    })
 
 def shop(request):
     products = Product.objects.filter(available=True)
-    categories = Category.objects.all()
+    categories = category_registry.all()
     selected_category = request.GET.get('category')
     if selected_category:
-        products = products.filter(category__slug=selected_category)
-    return render(request, 'store/shop.html', {'products': products, 'categories': categories})
+        # Filter on the foreign key column instead of joining the category table
+        category_id = category_registry.id_for_slug(selected_category)
+        products = products.filter(category_id=category_id) if category_id else products.none()
+    query = request.GET.get('q', '').strip()
+    if query:
+        products = products.filter(name__icontains=query)
+    return render(request, 'store/shop.html', {
+        'products': products,
+        'categories': categories,
+        'query': query,
+        'listing_version': listing_version('shop', products, selected_category, query),
+    })
+
+def autocomplete(request):
+    """Search-as-you-type suggestions, served from the in-memory index"""
+    return JsonResponse({'results': suggest(request.GET.get('q', ''))})
+
+def _sentiment_summary(reviews_with_sentiment):
+    """Count and percentage of analysed reviews per sentiment label"""
+    sentiment_data = {}
+    sentiment_counts = reviews_with_sentiment.values('reviewsentiment__sentiment_label').annotate(
+        count=Count('id')
+    )
+    total_sentiment_reviews = sum(item['count'] for item in sentiment_counts)
+    for item in sentiment_counts:
+        label = item['reviewsentiment__sentiment_label']
+        count = item['count']
+        percentage = round((count / total_sentiment_reviews) * 100, 1) if total_sentiment_reviews > 0 else 0
+        sentiment_data[label] = {
+            'count': count,
+            'percentage': percentage
+        }
+    return sentiment_data
 
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug)
-    reviews = product.reviews.all()
-    
-    # Get sentiment analysis data
-    sentiment_data = {}
-    reviews_with_sentiment = reviews.filter(reviewsentiment__isnull=False)
-    if reviews_with_sentiment.exists():
-        sentiment_counts = reviews_with_sentiment.values('reviewsentiment__sentiment_label').annotate(
-            count=Count('id')
-        )
-        total_sentiment_reviews = reviews_with_sentiment.count()
-        
-        for item in sentiment_counts:
-            label = item['reviewsentiment__sentiment_label']
-            count = item['count']
-            percentage = round((count / total_sentiment_reviews) * 100, 1) if total_sentiment_reviews > 0 else 0
-            sentiment_data[label] = {
-                'count': count,
-                'percentage': percentage
-            }
+    reviews = product.reviews.select_related('customer', 'reviewsentiment')
+    reviews_with_sentiment = product.reviews.filter(reviewsentiment__isnull=False)
     
     if request.method == "POST" and request.user.is_authenticated:
         rating = request.POST.get('rating')
@@ -45,11 +80,14 @@ def product_detail(request, slug):
         Review.objects.create(product=product, customer=request.user, rating=rating, comment=comment)
         return redirect('product-detail', slug=slug)
     
+    # Reviews, ratings and sentiment are rendered in cached fragments, so
+    # these are only queried when a fragment has to be re-rendered
     context = {
         'product': product, 
         'reviews': reviews,
-        'sentiment_data': sentiment_data,
-        'reviews_with_sentiment': reviews_with_sentiment
+        'sentiment_data': SimpleLazyObject(lambda: _sentiment_summary(reviews_with_sentiment)),
+        'reviews_with_sentiment': reviews_with_sentiment,
+        'recommendations': product_recommendations(product, limit=4),
     }
     return render(request, 'store/product_detail.html', context)
 
@@ -58,7 +96,7 @@ def add_product(request):
     if request.user.role != "seller":
         return redirect('store-home')
 
-    categories = Category.objects.all()
+    categories = category_registry.all()
 
     if request.method == "POST":
         name = request.POST['name']
@@ -66,8 +104,7 @@ def add_product(request):
         description = request.POST['description']
         price = request.POST['price']
         stock = request.POST['stock']
-        category_id = request.POST.get('category')
-        category = Category.objects.get(id=category_id) if category_id else None
+        category = category_registry.get(request.POST.get('category'))
         image = request.FILES.get('image')
 
         # If no category selected, allow seller to create a new one
@@ -75,16 +112,18 @@ def add_product(request):
         if not category and new_category_name:
             category, created = Category.objects.get_or_create(name=new_category_name, slug=new_category_name.lower().replace(' ', '-'))
 
-        Product.objects.create(
+        product = Product.objects.create(
             seller=request.user,
             name=name,
             slug=slug,
             description=description,
             price=price,
             stock=stock,
-            category=category,
+            category_id=category.id if category else None,
             image=image
         )
+        if image:
+            queue_image_processing(product.id)
         return redirect('seller-products')
 
     return render(request, 'store/add_product.html', {'categories': categories})
@@ -100,11 +139,44 @@ def seller_products(request):
 def all_seller_reviews(request):
     if request.user.role != "seller":
         return redirect('store-home')
-    products = Product.objects.filter(seller=request.user)
-    reviews = []
-    for product in products:
-        reviews.extend(product.reviews.all())
-    return render(request, 'store/all_seller_reviews.html', {'reviews': reviews})
+    products = Product.objects.filter(seller=request.user).only('id', 'name').order_by('name')
+
+    # One query for the whole page: joins product, customer and sentiment
+    reviews = Review.objects.filter(product__seller=request.user).select_related(
+        'product', 'customer', 'reviewsentiment'
+    )
+
+    filters = {
+        'product': request.GET.get('product', ''),
+        'rating': request.GET.get('rating', ''),
+        'has_reply': request.GET.get('has_reply', ''),
+        'sentiment': request.GET.get('sentiment', ''),
+    }
+    if filters['product'].isdigit():
+        reviews = reviews.filter(product_id=filters['product'])
+    if filters['rating'].isdigit():
+        reviews = reviews.filter(rating=filters['rating'])
+    if filters['has_reply'] == 'yes':
+        reviews = reviews.exclude(reply__isnull=True).exclude(reply='')
+    elif filters['has_reply'] == 'no':
+        reviews = reviews.filter(Q(reply__isnull=True) | Q(reply=''))
+    if filters['sentiment'] in ('positive', 'negative', 'neutral'):
+        reviews = reviews.filter(reviewsentiment__sentiment_label=filters['sentiment'])
+
+    page, next_cursor = keyset_page(reviews, 'created', request.GET.get('cursor'))
+
+    # Keep the active filters on the "next page" link
+    query = request.GET.copy()
+    query.pop('cursor', None)
+
+    context = {
+        'reviews': page,
+        'products': products,
+        'filters': filters,
+        'next_cursor': next_cursor,
+        'filter_query': query.urlencode(),
+    }
+    return render(request, 'store/all_seller_reviews.html', context)
 
 @login_required
 def seller_reviews(request, product_id):
@@ -125,7 +197,7 @@ def update_product(request, product_id):
     if request.user.role != "seller":
         return redirect('store-home')
     product = get_object_or_404(Product, id=product_id, seller=request.user)
-    categories = Category.objects.all()
+    categories = category_registry.all()
 
     if request.method == "POST":
         product.name = request.POST['name']
@@ -133,12 +205,18 @@ def update_product(request, product_id):
         product.description = request.POST['description']
         product.price = request.POST['price']
         product.stock = request.POST['stock']
-        category_id = request.POST.get('category')
-        product.category = Category.objects.get(id=category_id) if category_id else product.category
+        category = category_registry.get(request.POST.get('category'))
+        if category:
+            product.category_id = category.id
         image = request.FILES.get('image')
         if image:
+            # Old variants belong to the old image; new ones are built in the background
             product.image = image
+            product.image_width = product.image_height = None
+            product.image_variants = {}
         product.save()
+        if image:
+            queue_image_processing(product.id)
         return redirect('seller-products')
 
     return render(request, 'store/update_product.html', {'product': product, 'categories': categories})
@@ -152,4 +230,79 @@ def delete_product(request, product_id):
     product.delete()
     return redirect('seller-products')
 
+@login_required
+def import_products(request):
+    if request.user.role != "seller":
+        return redirect('store-home')
+
+    context = {}
+    upload = request.FILES.get('file')
+    if request.method == "POST" and upload:
+        result = bulk.import_products(upload.file, request.user, fmt=bulk.detect_format(upload.name))
+        context = {
+            'result': result,
+            'errors_shown': result['errors'][:100],
+            'errors_hidden': max(0, len(result['errors']) - 100),
+        }
+    return render(request, 'store/import_products.html', context)
+
+@login_required
+@require_POST
+def bulk_update_products(request):
+    """Apply many price/stock/availability changes in one request (JSON or file upload)"""
+    if request.user.role != "seller":
+        return JsonResponse({'success': False, 'message': 'Access denied'})
+
+    upload = request.FILES.get('file')
+    if upload:
+        rows = bulk.iter_rows(upload.file, bulk.detect_format(upload.name))
+    else:
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Request body must be JSON'})
+        changes = payload.get('changes') if isinstance(payload, dict) else payload
+        if not isinstance(changes, list):
+            return JsonResponse({'success': False, 'message': 'Expected a list of changes'})
+        rows = enumerate(changes, start=1)
+
+    result = bulk.update_products(rows, request.user)
+    return JsonResponse({
+        'success': True,
+        'message': f"Updated {result['updated']} products, {len(result['errors'])} rows rejected",
+        'updated': result['updated'],
+        'errors': [{'row': row_number, 'message': message} for row_number, message in result['errors']],
+    })
+
+@login_required
+def export_products(request):
+    if request.user.role != "seller":
+        return redirect('store-home')
+
+    if request.GET.get('format') == 'jsonl':
+        response = StreamingHttpResponse(bulk.stream_jsonl(request.user), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="products.jsonl"'
+    else:
+        response = StreamingHttpResponse(bulk.stream_csv(request.user), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="products.csv"'
+    return response
+
+
+def serve_media(request, path):
+    """Serve uploaded media with strong ETags; content-addressed blobs are immutable"""
+    try:
+        full_path = default_storage.path(path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found")
+
+    digest, immutable = media_etag(path, full_path)
+    response = FileResponse(open(full_path, 'rb'), content_type=mimetypes.guess_type(full_path)[0])
+    response['ETag'] = quote_etag(digest)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
 
+    conditional = get_conditional_response(request, etag=response['ETag'], response=response)
+    if conditional is not response:
+        response.close()
+    return conditional